@@ -95,12 +95,25 @@ class FactCheckApp {
                 this.showStatus(`Transcript fetched! (${transcript.length} entries). Creating issue...`, 'success');
                 
                 // Create issue with transcript
-                const issueUrl = githubAPI.getIssueURLWithTranscript(videoId, transcript);
+                const issue = await githubAPI.getIssueWithTranscript(videoId, transcript);
+                let bodyStep = `2. The issue will be pre-filled with the transcript<br>`;
+                
+                if (!issue.fitsInURL) {
+                    // Too long for a pre-filled link - hand the body over through the clipboard
+                    try {
+                        await navigator.clipboard.writeText(issue.body);
+                        bodyStep = `2. The transcript was copied to your clipboard - paste it as the issue description<br>`;
+                    } catch (error) {
+                        console.error('Could not copy transcript:', error);
+                        this.showStatus('This transcript is too long to pre-fill an issue and could not be copied to the clipboard.', 'error');
+                        return;
+                    }
+                }
                 
                 this.showStatus(
                     `Transcript ready! Now:<br><br>` +
-                    `1. <a href="${issueUrl}" target="_blank" style="color: white; text-decoration: underline; font-weight: bold;">Click here to create the fact-check request</a><br>` +
-                    `2. The issue will be pre-filled with the transcript<br>` +
+                    `1. <a href="${issue.url}" target="_blank" style="color: white; text-decoration: underline; font-weight: bold;">Click here to create the fact-check request</a><br>` +
+                    bodyStep +
                     `3. Submit the issue - processing starts immediately!<br>` +
                     `4. Come back and click "Start Polling" below<br><br>` +
                     `<button id="startPolling" style="padding: 10px 20px; background: #48bb78; color: white; border: none; border-radius: 8px; cursor: pointer; font-weight: 600; margin-top: 10px;">Start Polling for Results</button>`,
@@ -119,7 +132,7 @@ class FactCheckApp {
                         
                         try {
                             results = await githubAPI.pollForResults(videoId, 30, 3000);
-                            await this.displayResults(videoId, results.claims);
+                            await this.displayResults(videoId, results.claims, results.timeline);
                             this.showStatus('Fact-check complete!', 'success');
                         } catch (error) {
                             this.showStatus(`Error: ${error.message}`, 'error');
@@ -133,7 +146,7 @@ class FactCheckApp {
             // Display results
             if (results) {
                 this.showStatus('Fact-check complete!', 'success');
-                await this.displayResults(videoId, results.claims);
+                await this.displayResults(videoId, results.claims, results.timeline);
             }
 
         } catch (error) {
@@ -200,7 +213,7 @@ class FactCheckApp {
         }
     }
 
-    async displayResults(videoId, claims) {
+    async displayResults(videoId, claims, timeline) {
         const videoContainer = document.getElementById('videoContainer');
         videoContainer.classList.remove('hidden');
 
@@ -208,7 +221,7 @@ class FactCheckApp {
         videoPlayer.destroy();
 
         // Initialize new player
-        await videoPlayer.initialize(videoId, claims);
+        await videoPlayer.initialize(videoId, claims, timeline);
         
         // Render claims list
         videoPlayer.renderClaimsList(claims);
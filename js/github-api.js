@@ -3,25 +3,69 @@ const GITHUB_CONFIG = {
     repo: 'video-fact-checker'
 };
 
+// Transcript encoding decoded by scripts/process_single_issue.py; "fctx1z" is the gzipped variant
+const WIRE_FORMAT = 'fctx1';
+// Longer pre-filled issue URLs are rejected, so the body goes through the clipboard instead
+const MAX_ISSUE_URL_LENGTH = 8000;
+
 class GitHubAPI {
     constructor(config) {
         this.config = config;
         this.baseURL = 'https://api.github.com';
+        this.manifest = null;
+        // Shard name -> promise of its bytes
+        this.shards = new Map();
+    }
+
+    encodeTranscript(transcript) {
+        // Entry count, base-36 millisecond deltas between starts, then one escaped line per entry
+        let previous = 0;
+        const deltas = transcript.map(entry => {
+            const ms = Math.round(entry.start * 1000);
+            const delta = ms - previous;
+            previous = ms;
+            return delta.toString(36);
+        });
+        const texts = transcript.map(entry =>
+            entry.text.trim().replace(/\\/g, '\\\\').replace(/`/g, '\\`').replace(/\r?\n/g, '\\n')
+        );
+        return `${transcript.length}\n${deltas.join(',')}\n${texts.join('\n')}`;
+    }
+
+    async gzipBase64(text) {
+        const stream = new Blob([text]).stream().pipeThrough(new CompressionStream('gzip'));
+        const bytes = new Uint8Array(await new Response(stream).arrayBuffer());
+        let binary = '';
+        for (let i = 0; i < bytes.length; i += 0x8000) {
+            binary += String.fromCharCode.apply(null, bytes.subarray(i, i + 0x8000));
+        }
+        return btoa(binary);
     }
 
-    getIssueURLWithTranscript(videoId, transcript) {
-        // Generate URL for creating issue with transcript in body
+    async getIssueWithTranscript(videoId, transcript) {
+        // Generate URL for creating issue with the compact transcript in the body
         const title = encodeURIComponent(`Fact-check: ${videoId}`);
         
-        // Format transcript as JSON in the body
-        const transcriptJSON = JSON.stringify(transcript, null, 2);
-        const body = encodeURIComponent(
-            `Video: https://youtube.com/watch?v=${videoId}\n\n` +
+        const payload = this.encodeTranscript(transcript);
+        let block = `\`\`\`${WIRE_FORMAT}\n${payload}\n\`\`\``;
+        if (typeof CompressionStream !== 'undefined') {
+            const compressed = await this.gzipBase64(payload);
+            if (compressed.length < payload.length) {
+                block = `\`\`\`${WIRE_FORMAT}z\n${compressed}\n\`\`\``;
+            }
+        }
+        
+        const body = `Video: https://youtube.com/watch?v=${videoId}\n\n` +
             `**Transcript Data:**\n` +
-            `\`\`\`json\n${transcriptJSON}\n\`\`\``
-        );
+            block;
         
-        return `https://github.com/${this.config.owner}/${this.config.repo}/issues/new?title=${title}&body=${body}`;
+        const baseURL = `https://github.com/${this.config.owner}/${this.config.repo}/issues/new?title=${title}`;
+        const url = `${baseURL}&body=${encodeURIComponent(body)}`;
+        
+        if (url.length <= MAX_ISSUE_URL_LENGTH) {
+            return { url, body, fitsInURL: true };
+        }
+        return { url: baseURL, body, fitsInURL: false };
     }
 
     getIssueURL(videoId) {
@@ -31,9 +75,79 @@ class GitHubAPI {
         return `https://github.com/${this.config.owner}/${this.config.repo}/issues/new?title=${title}&body=${body}`;
     }
 
-    async checkForResults(videoId) {
+    resultsURL(path) {
+        return `https://raw.githubusercontent.com/${this.config.owner}/${this.config.repo}/main/results/${path}`;
+    }
+
+    async loadManifest(refresh = false) {
+        // One small file maps every checked video to its shard (see scripts/results_store.py)
+        if (!this.manifest || refresh) {
+            const response = refresh
+                ? await fetch(`${this.resultsURL('manifest.json')}?t=${Date.now()}`, { cache: 'no-store' })
+                : await fetch(this.resultsURL('manifest.json'));
+            this.manifest = response.ok ? await response.json() : null;
+        }
+        return this.manifest;
+    }
+
+    loadShard(name) {
+        // Shard names change with their content, so a shard fetched once never goes stale
+        if (!this.shards.has(name)) {
+            const request = this.fetchShard(name);
+            request.catch(() => this.shards.delete(name));
+            this.shards.set(name, request);
+        }
+        return this.shards.get(name);
+    }
+
+    async fetchShard(name) {
+        const response = await fetch(this.resultsURL(name));
+        if (!response.ok) {
+            throw new Error(`Shard ${name}: HTTP ${response.status}`);
+        }
+        if (name.endsWith('.gz')) {
+            const stream = response.body.pipeThrough(new DecompressionStream('gzip'));
+            return new Uint8Array(await new Response(stream).arrayBuffer());
+        }
+        return new Uint8Array(await response.arrayBuffer());
+    }
+
+    async readFromStore(videoId, refresh) {
+        const manifest = await this.loadManifest(refresh);
+        const entry = manifest && manifest.videos[videoId];
+        if (!entry) {
+            return null;
+        }
+        const [shard, offset, length] = entry;
+        const bytes = await this.loadShard(manifest.shards[shard]);
+        return JSON.parse(new TextDecoder().decode(bytes.subarray(offset, offset + length)));
+    }
+
+    async checkForResults(videoId, refresh = false) {
         // No authentication needed to read from public repo
-        const url = `https://raw.githubusercontent.com/${this.config.owner}/${this.config.repo}/main/results/${videoId}.json`;
+        try {
+            const results = await this.readFromStore(videoId, refresh);
+            if (results) {
+                return results;
+            }
+        } catch (error) {
+            // A cached manifest can name a shard that has since been replaced; retry with a fresh one
+            console.log('Retrying results lookup with a fresh manifest:', error.message);
+            try {
+                const results = await this.readFromStore(videoId, true);
+                if (results) {
+                    return results;
+                }
+            } catch (retryError) {
+                console.error('Error reading results store:', retryError);
+            }
+        }
+
+        // Before the first flush there is no manifest and results are still one file per video
+        if (this.manifest) {
+            return null;
+        }
+        const url = this.resultsURL(`${videoId}.json`);
         
         try {
             const response = await fetch(url);
@@ -59,7 +173,8 @@ class GitHubAPI {
         for (let i = 0; i < maxAttempts; i++) {
             console.log(`Polling attempt ${i + 1}/${maxAttempts}`);
             
-            const results = await this.checkForResults(videoId);
+            // The manifest is re-read on each attempt so new results show up
+            const results = await this.checkForResults(videoId, true);
             
             if (results) {
                 console.log('Results found!');
@@ -1,7 +1,32 @@
+// Same overlay timing and bucket size as scripts/timeline.py
+const DEFAULT_TIMELINE = { bucket_seconds: 10, lead_seconds: 3, min_seconds: 6 };
+
+function overlayInterval(claim, timeline) {
+    const start = claim.timestamp || 0;
+    const end = Math.max(claim.end || 0, start - timeline.lead_seconds + timeline.min_seconds);
+    return [Math.max(0, start - timeline.lead_seconds), end];
+}
+
+function buildTimeline(claims) {
+    // Results written before the index existed come without one
+    const timeline = { ...DEFAULT_TIMELINE, buckets: {} };
+    claims.forEach((claim, index) => {
+        const [start, end] = overlayInterval(claim, timeline);
+        const first = Math.floor(start / timeline.bucket_seconds);
+        const last = Math.max(first, Math.ceil(end / timeline.bucket_seconds) - 1);
+        for (let bucket = first; bucket <= last; bucket++) {
+            (timeline.buckets[bucket] = timeline.buckets[bucket] || []).push(index);
+        }
+    });
+    return timeline;
+}
+
 class VideoPlayer {
     constructor() {
         this.player = null;
         this.claims = [];
+        this.timeline = null;
+        // Indexes of the claims whose bubbles are on screen
         this.activeBubbles = new Set();
         this.checkInterval = null;
     }
@@ -22,8 +47,8 @@ class VideoPlayer {
         });
     }
 
-    async initialize(videoId, claimsData) {
-        this.claims = claimsData;
+    async initialize(videoId, claimsData, timeline) {
+        this.setClaims(claimsData, timeline);
         
         await this.loadYouTubeAPI();
         
@@ -68,25 +93,39 @@ class VideoPlayer {
         }
     }
 
+    setClaims(claimsData, timeline) {
+        this.claims = claimsData;
+        this.timeline = timeline && timeline.buckets ? timeline : buildTimeline(claimsData);
+    }
+
+    activeClaims(currentTime) {
+        // Only the claims indexed under the current time bucket can be showing
+        const bucket = this.timeline.buckets[Math.floor(currentTime / this.timeline.bucket_seconds)] || [];
+        return bucket.filter((index) => {
+            const [start, end] = overlayInterval(this.claims[index], this.timeline);
+            return start <= currentTime && currentTime < end;
+        });
+    }
+
     updateOverlays() {
         if (!this.player || !this.player.getCurrentTime) return;
         
         const currentTime = this.player.getCurrentTime();
         const overlaysContainer = document.getElementById('overlays');
+        const active = new Set(this.activeClaims(currentTime));
         
-        // Show/hide bubbles based on timestamp
-        this.claims.forEach((claim, index) => {
-            const shouldShow = Math.abs(currentTime - claim.timestamp) < 3; // Show within 3 seconds
-            const bubbleId = `bubble-${index}`;
-            
-            if (shouldShow && !this.activeBubbles.has(bubbleId)) {
-                this.showBubble(claim, index, overlaysContainer);
-                this.activeBubbles.add(bubbleId);
-            } else if (!shouldShow && this.activeBubbles.has(bubbleId)) {
-                this.hideBubble(bubbleId);
-                this.activeBubbles.delete(bubbleId);
+        // Touch the DOM only for bubbles that appear or disappear
+        this.activeBubbles.forEach((index) => {
+            if (!active.has(index)) {
+                this.hideBubble(`bubble-${index}`);
+            }
+        });
+        active.forEach((index) => {
+            if (!this.activeBubbles.has(index)) {
+                this.showBubble(this.claims[index], index, overlaysContainer);
             }
         });
+        this.activeBubbles = active;
     }
 
     showBubble(claim, index, container) {
@@ -155,6 +194,7 @@ class VideoPlayer {
         }
         this.player = null;
         this.claims = [];
+        this.timeline = null;
         this.activeBubbles.clear();
     }
 }
@@ -0,0 +1,147 @@
+import math
+import re
+from collections import defaultdict
+
+from transcript import as_transcript
+
+# Words too common to say anything about where a claim was made
+STOPWORDS = frozenset("""
+a about above after again against all also am an and any are as at be because been before being
+below between both but by can could did do does doing down during each few for from further had
+has have having he her here hers him his how i if in into is it its just like me more most my no
+nor not now of off on once only or other our ours out over own really same she should so some
+such than that the their theirs them then there these they this those through to too under until
+up very was we were what when where which while who whom why will with would you your yours
+""".split())
+
+DEFAULT_MAX_SPAN = 4
+DEFAULT_MIN_CONFIDENCE = 0.25
+# Candidate windows scored per query; the rest are never evaluated
+CANDIDATES_PER_QUERY = 24
+# Fallback length for the last segment, which has no successor to end it
+LAST_SEGMENT_SECONDS = 5.0
+
+def tokenize(text):
+    """Lowercase content words used for indexing and scoring."""
+    return tokenize_lowered(text.lower())
+
+def tokenize_lowered(text):
+    """tokenize() for text that is already lowercase, such as Transcript.segment_lower()."""
+    words = re.findall(r"[a-z0-9]+", text.replace("'", ''))
+    return [word for word in words if word not in STOPWORDS and (len(word) > 2 or word.isdigit())]
+
+class ClaimAligner:
+    """Inverted index over transcript segments that aligns claims to time ranges."""
+
+    def __init__(self, transcript_data, max_span=DEFAULT_MAX_SPAN, min_confidence=DEFAULT_MIN_CONFIDENCE):
+        self.max_span = max_span
+        self.min_confidence = min_confidence
+        self.transcript = as_transcript(transcript_data)
+        self.segment_tokens = []
+        self.segment_bigrams = []
+        self.postings = defaultdict(list)
+        previous = []
+
+        for index in range(len(self.transcript)):
+            tokens = tokenize_lowered(self.transcript.segment_lower(index))
+            unique = set(tokens)
+            bigrams = set(zip(tokens, tokens[1:]))
+            # Claims crossing a caption boundary split a bigram across two segments
+            if previous and tokens:
+                bigrams.add((previous[-1], tokens[0]))
+            self.segment_tokens.append(unique)
+            self.segment_bigrams.append(bigrams)
+            for token in unique:
+                self.postings[token].append(index)
+            previous = tokens
+
+        total = max(len(self.transcript), 1)
+        self.idf = {token: math.log(1 + total / len(segments)) for token, segments in self.postings.items()}
+        # Tokens present in a large share of segments only add noise to the candidate set
+        self.max_postings = max(50, total // 10)
+
+    def segment_end(self, index):
+        if index + 1 < len(self.transcript):
+            return self.transcript.start(index + 1)
+        return self.transcript.start(index) + LAST_SEGMENT_SECONDS
+
+    def _candidate_windows(self, query_tokens):
+        scores = defaultdict(float)
+        for token in query_tokens:
+            segments = self.postings.get(token)
+            if not segments or len(segments) > self.max_postings:
+                continue
+            weight = self.idf[token]
+            for index in segments:
+                scores[index] += weight
+
+        # Rank window starts by the combined score of the segments they span
+        windows = defaultdict(float)
+        for index, score in scores.items():
+            for first in range(max(0, index - self.max_span + 1), index + 1):
+                windows[first] += score
+        return sorted(windows, key=windows.get, reverse=True)[:CANDIDATES_PER_QUERY]
+
+    def _redundant(self, index, first, last, query_tokens):
+        matched = self.segment_tokens[index] & query_tokens
+        for other in range(first, last + 1):
+            matched -= self.segment_tokens[other]
+        return not matched
+
+    def _score_window(self, first, last, query_tokens, query_bigrams, query_weight):
+        covered = set()
+        bigrams = set()
+        for index in range(first, last + 1):
+            covered |= self.segment_tokens[index] & query_tokens
+            bigrams |= self.segment_bigrams[index] & query_bigrams
+
+        unigram = sum(self.idf.get(token, 0.0) for token in covered) / query_weight
+        if not query_bigrams:
+            return unigram
+        bigram = len(bigrams) / len(query_bigrams)
+        return 0.7 * unigram + 0.3 * bigram
+
+    def _align_text(self, text):
+        tokens = tokenize(text)
+        query_tokens = set(tokens)
+        query_bigrams = set(zip(tokens, tokens[1:]))
+        query_weight = sum(self.idf.get(token, 0.0) for token in query_tokens)
+        if not query_weight:
+            return None
+
+        best = None
+        for first in self._candidate_windows(query_tokens):
+            last = min(first + self.max_span - 1, len(self.transcript) - 1)
+
+            # Trim edge segments that add no query words the rest of the window lacks
+            while first < last and self._redundant(first, first + 1, last, query_tokens):
+                first += 1
+            while last > first and self._redundant(last, first, last - 1, query_tokens):
+                last -= 1
+
+            score = self._score_window(first, last, query_tokens, query_bigrams, query_weight)
+            # Prefer tighter windows when scores tie
+            if best is None or score > best[0] or (score == best[0] and last - first < best[2] - best[1]):
+                best = (score, first, last)
+
+        return best
+
+    def align(self, claim_text, context_text=''):
+        """Return the best start, end and confidence for a claim, or None if nothing matches."""
+        best = None
+        for text in (claim_text, context_text):
+            if not text:
+                continue
+            match = self._align_text(text)
+            if match and (best is None or match[0] > best[0]):
+                best = match
+
+        if best is None or best[0] < self.min_confidence:
+            return None
+
+        score, first, last = best
+        return {
+            'start': self.transcript.start(first),
+            'end': self.segment_end(last),
+            'confidence': round(min(score, 1.0), 3),
+        }
@@ -0,0 +1,132 @@
+"""Fact-check many videos from a JSONL manifest without filing issues.
+
+Each manifest line is either a JSON string with a video ID or an object
+{"video_id": "...", "transcript": [{"start": 0.0, "text": "..."}, ...]}.
+Lines without a transcript are fetched with yt-dlp. Finished video IDs are
+appended to a checkpoint file as they complete, so rerunning the same
+command resumes where an interrupted run stopped. Every attempt is recorded
+in a status JSONL file.
+
+Usage: python scripts/backfill.py manifest.jsonl [--workers 4]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+DEFAULT_WORKERS = 4
+
+_openai_client = None
+
+def init_worker(workers):
+    """Create one OpenAI client per worker process and split the API limits between workers."""
+    global _openai_client
+    for name, default in (('OPENAI_RPM', 500), ('OPENAI_TPM', 200000)):
+        os.environ[name] = str(max(1, int(os.environ.get(name, default)) // workers))
+
+    from rate_limit import create_openai_client
+    _openai_client = create_openai_client(os.environ['OPENAI_API_KEY'])
+
+def run_item(item):
+    """Process one manifest entry in a worker process and describe the outcome."""
+    started = time.time()
+    video_id = item['video_id']
+    try:
+        if item.get('transcript'):
+            import process_single_issue
+            result = process_single_issue.process_video(video_id, item['transcript'], _openai_client)
+        else:
+            import process_queue
+            result = process_queue.process_video(video_id, _openai_client)
+        status = 'skipped' if result['message'] == 'Already processed' else 'completed'
+        message = result['message']
+    except Exception as e:
+        status = 'failed'
+        message = str(e)
+
+    return {
+        'video_id': video_id,
+        'status': status,
+        'message': message,
+        'seconds': round(time.time() - started, 2),
+    }
+
+def read_manifest(path):
+    items = []
+    with open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            if isinstance(entry, str):
+                entry = {'video_id': entry}
+            if not entry.get('video_id'):
+                print(f"Skipping manifest line {line_number}: no video_id")
+                continue
+            items.append(entry)
+    return items
+
+def read_checkpoint(path):
+    if not os.path.exists(path):
+        return set()
+    with open(path) as f:
+        return set(line.strip() for line in f if line.strip())
+
+def append_line(f, line):
+    # Flush to disk so a crash never loses a finished item
+    f.write(line + '\n')
+    f.flush()
+    os.fsync(f.fileno())
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('manifest', help='JSONL file of video IDs or {video_id, transcript} objects')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='worker processes')
+    parser.add_argument('--checkpoint', help='finished video IDs (default: <manifest>.checkpoint)')
+    parser.add_argument('--status', help='per-item status JSONL (default: <manifest>.status.jsonl)')
+    args = parser.parse_args()
+
+    if not os.environ.get('OPENAI_API_KEY'):
+        print("Missing required environment variables")
+        sys.exit(1)
+
+    checkpoint_path = args.checkpoint or f"{args.manifest}.checkpoint"
+    status_path = args.status or f"{args.manifest}.status.jsonl"
+
+    items = read_manifest(args.manifest)
+    done = read_checkpoint(checkpoint_path)
+    pending = [item for item in items if item['video_id'] not in done]
+    print(f"Manifest: {len(items)} videos, {len(items) - len(pending)} already done, {len(pending)} to process with {args.workers} workers")
+    if not pending:
+        return
+
+    counts = {}
+    started = time.time()
+    with open(checkpoint_path, 'a') as checkpoint, open(status_path, 'a') as status_file:
+        executor = ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker, initargs=(args.workers,))
+        try:
+            futures = [executor.submit(run_item, item) for item in pending]
+            for number, future in enumerate(as_completed(futures), 1):
+                outcome = future.result()
+                append_line(status_file, json.dumps(outcome))
+                # Failed items stay out of the checkpoint so a rerun retries them
+                if outcome['status'] != 'failed':
+                    append_line(checkpoint, outcome['video_id'])
+                counts[outcome['status']] = counts.get(outcome['status'], 0) + 1
+                print(f"[{number}/{len(pending)}] {outcome['video_id']}: {outcome['status']} ({outcome['seconds']}s) {outcome['message']}")
+        except KeyboardInterrupt:
+            print("Interrupted - finished items are checkpointed, rerun to resume")
+            executor.shutdown(wait=False, cancel_futures=True)
+            sys.exit(130)
+        executor.shutdown()
+
+    elapsed = time.time() - started
+    print(f"Backfill finished in {elapsed:.0f}s: " + ', '.join(f"{count} {status}" for status, count in sorted(counts.items())))
+    if counts.get('failed'):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
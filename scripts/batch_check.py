@@ -0,0 +1,244 @@
+"""Fact-check a backlog of videos through the OpenAI Batch API.
+
+Batch jobs cost less and have their own, much larger rate limits, but may
+take up to 24 hours. Use this for backfills and re-checks that nobody is
+waiting on. The manifest uses the same format as backfill.py.
+
+Usage:
+  python scripts/batch_check.py submit manifest.jsonl   # prepare prompts and submit
+  python scripts/batch_check.py wait                    # poll until the batch finishes
+  python scripts/batch_check.py collect                 # align outputs and stage results
+  python scripts/batch_check.py run manifest.jsonl      # all three in one go
+
+OPENAI_BASE_URL points the client at a local stand-in server for testing.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+
+from backfill import read_manifest
+from chunking import chunk_settings, split_transcript, merge_claim_lists, carry_claims
+from claim_index import split_known_claims, record_result
+from compaction import compact_for_prompt
+from worthiness import prefilter_for_prompt
+from llm_cache import get_cache
+from metrics import write_metrics
+from routing import route_claims, tiered_enabled
+from rate_limit import openai_call, create_openai_client, print_rate_limit_stats
+from results_store import save_result
+from timeline import sort_claims, build_timeline
+from incremental import previous_result, needs_recheck, reusable_chunks, check_record
+from transcript import Transcript, format_transcript
+import pipeline
+
+DEFAULT_WORK_DIR = '.cache/batch'
+DEFAULT_POLL_SECONDS = 60
+ENDPOINT = '/v1/chat/completions'
+FINISHED_STATES = frozenset(['completed', 'failed', 'expired', 'cancelled'])
+
+def _state_path(work_dir):
+    return os.path.join(work_dir, 'batch.json')
+
+def _video_path(work_dir, video_id):
+    return os.path.join(work_dir, 'videos', f"{video_id}.json")
+
+def load_transcript(item):
+    if item.get('transcript'):
+        return item['transcript']
+    # Only needed for videos without a transcript in the manifest
+    from process_queue import get_transcript
+    return get_transcript(item['video_id'])
+
+def prepare(items, work_dir):
+    """Write the Batch API input file plus one sidecar per video. Returns the input path."""
+    os.makedirs(os.path.join(work_dir, 'videos'), exist_ok=True)
+    settings = chunk_settings()
+    input_path = os.path.join(work_dir, 'input.jsonl')
+    videos = []
+
+    with open(input_path, 'w') as f:
+        for item in items:
+            video_id = item['video_id']
+            previous = previous_result(video_id)
+            if previous is not None and not needs_recheck(previous, pipeline.MODEL, pipeline.PROMPT_VERSION):
+                print(f"Video {video_id} already processed, skipping")
+                continue
+            # Chunks unchanged since the previous check are carried over instead of submitted
+            carried = reusable_chunks(previous, pipeline.MODEL, pipeline.PROMPT_VERSION)
+
+            transcript = load_transcript(item)
+            if not transcript:
+                print(f"Skipping {video_id}: no transcript")
+                continue
+
+            transcript = compact_for_prompt(transcript)
+            if not transcript:
+                print(f"Skipping {video_id}: no speech in transcript")
+                continue
+            full_text, transcript_data = format_transcript(transcript)
+            reused_claims, unchecked_data = split_known_claims(transcript_data, exclude_video=video_id)
+            unchecked_data = prefilter_for_prompt(unchecked_data)
+            chunks = split_transcript(unchecked_data, settings['max_chars'], settings['overlap_chars'])
+
+            fresh = [chunk for chunk in chunks if chunk['hash'] not in carried]
+            if carried and not fresh:
+                print(f"Video {video_id} is unchanged since it was last checked, skipping")
+                continue
+            for chunk in fresh:
+                f.write(json.dumps({
+                    'custom_id': f"{video_id}::{chunk['index']}",
+                    'method': 'POST',
+                    'url': ENDPOINT,
+                    'body': {
+                        'model': pipeline.MODEL,
+                        'messages': pipeline.build_messages(chunk['text']),
+                        'temperature': pipeline.TEMPERATURE,
+                    },
+                }) + '\n')
+
+            # Everything collect needs to turn outputs back into a results file
+            with open(_video_path(work_dir, video_id), 'w') as sidecar:
+                json.dump({
+                    'video_id': video_id,
+                    'transcript_data': transcript_data.to_entries(),
+                    'reused_claims': reused_claims,
+                    'chunks': [{'index': chunk['index'], 'hash': chunk['hash'], 'start': chunk['start'], 'text': chunk['text']} for chunk in chunks],
+                    'carried': {chunk['hash']: carried[chunk['hash']] for chunk in chunks if chunk['hash'] in carried},
+                }, sidecar)
+            videos.append(video_id)
+            print(f"Prepared {video_id}: {len(fresh)} requests, {len(chunks) - len(fresh)} unchanged chunks carried over")
+
+    return input_path, videos
+
+def submit(client, items, work_dir):
+    input_path, videos = prepare(items, work_dir)
+    if not videos:
+        print("Nothing to submit")
+        return None
+
+    with open(input_path, 'rb') as f:
+        input_file = openai_call(client.files.create, file=f, purpose='batch')
+    batch = openai_call(client.batches.create, input_file_id=input_file.id, endpoint=ENDPOINT, completion_window='24h')
+
+    with open(_state_path(work_dir), 'w') as f:
+        json.dump({'batch_id': batch.id, 'input_file_id': input_file.id, 'videos': videos, 'submitted_at': time.time()}, f)
+    print(f"Submitted batch {batch.id} with {len(videos)} videos")
+    return batch.id
+
+def wait(client, work_dir, poll_seconds=DEFAULT_POLL_SECONDS):
+    with open(_state_path(work_dir)) as f:
+        state = json.load(f)
+
+    while True:
+        batch = openai_call(client.batches.retrieve, state['batch_id'])
+        counts = batch.request_counts
+        progress = f"{counts.completed}/{counts.total} done, {counts.failed} failed" if counts else ''
+        print(f"Batch {batch.id}: {batch.status} {progress}")
+        if batch.status in FINISHED_STATES:
+            return batch
+        time.sleep(poll_seconds)
+
+def _read_file(client, file_id):
+    if not file_id:
+        return []
+    content = openai_call(client.files.content, file_id)
+    return [json.loads(line) for line in content.text.splitlines() if line.strip()]
+
+def collect(client, work_dir):
+    """Align batch outputs and write results files. Returns the number of videos written."""
+    with open(_state_path(work_dir)) as f:
+        state = json.load(f)
+    batch = openai_call(client.batches.retrieve, state['batch_id'])
+
+    outputs = {}
+    for line in _read_file(client, batch.output_file_id) + _read_file(client, batch.error_file_id):
+        response = line.get('response') or {}
+        if response.get('status_code') == 200:
+            outputs[line['custom_id']] = response['body']['choices'][0]['message']['content']
+        else:
+            print(f"Request {line['custom_id']} failed: {line.get('error') or response.get('body')}")
+
+    cache = get_cache()
+    written = 0
+    for video_id in state['videos']:
+        with open(_video_path(work_dir, video_id)) as f:
+            video = json.load(f)
+
+        fresh = [chunk for chunk in video['chunks'] if chunk['hash'] not in video['carried']]
+        contents = {chunk['index']: outputs.get(f"{video_id}::{chunk['index']}") for chunk in fresh}
+        if any(content is None for content in contents.values()):
+            print(f"Skipping {video_id}: some requests have no output, resubmit it later")
+            continue
+
+        # Seed the response cache so a later synchronous run of the same chunks is free
+        if cache is not None:
+            for chunk in fresh:
+                messages = pipeline.build_messages(chunk['text'])
+                cache.put(cache.make_key(pipeline.MODEL, messages, pipeline.TEMPERATURE), contents[chunk['index']])
+
+        claim_lists = []
+        for chunk in video['chunks']:
+            if chunk['index'] in contents:
+                claims = pipeline.parse_claims(contents[chunk['index']])
+                if tiered_enabled():
+                    # Doubtful verdicts from the batch are verified synchronously on the strong model
+                    claims = route_claims(claims, client, pipeline.TEMPERATURE)
+                claim_lists.append(claims)
+            else:
+                claim_lists.append(carry_claims(video['carried'][chunk['hash']], chunk))
+        merged, indexes = merge_claim_lists(claim_lists)
+        chunk_log = [{'hash': chunk['hash'], 'start': chunk['start'], 'claims': produced}
+                     for chunk, produced in zip(video['chunks'], indexes)]
+
+        claims = video['reused_claims'] + merged
+        transcript_data = Transcript.from_entries(video['transcript_data'])
+        results, positions = sort_claims(pipeline.match_claims_to_timestamps(claims, transcript_data))
+        save_result(video_id, {
+            'video_id': video_id,
+            'claims': results,
+            'timeline': build_timeline(results),
+            'check': check_record(pipeline.MODEL, pipeline.PROMPT_VERSION, chunk_log,
+                                  offset=len(video['reused_claims']), positions=positions),
+        })
+        record_result(video_id, results)
+        written += 1
+        print(f"Results saved for {video_id}: {len(results)} claims")
+
+    print(f"Collected {written}/{len(state['videos'])} videos from batch {batch.id}")
+    return written
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('command', choices=['submit', 'wait', 'collect', 'run'])
+    parser.add_argument('manifest', nargs='?', help='JSONL manifest (submit and run)')
+    parser.add_argument('--work-dir', default=DEFAULT_WORK_DIR)
+    parser.add_argument('--poll-seconds', type=float, default=DEFAULT_POLL_SECONDS)
+    args = parser.parse_args()
+
+    if not os.environ.get('OPENAI_API_KEY'):
+        print("Missing required environment variables")
+        sys.exit(1)
+    if args.command in ('submit', 'run') and not args.manifest:
+        parser.error(f"{args.command} needs a manifest")
+
+    client = create_openai_client(os.environ['OPENAI_API_KEY'])
+
+    if args.command in ('submit', 'run'):
+        if submit(client, read_manifest(args.manifest), args.work_dir) is None:
+            return
+    if args.command in ('wait', 'run'):
+        batch = wait(client, args.work_dir, args.poll_seconds)
+        if batch.status != 'completed':
+            print(f"Batch ended as {batch.status}")
+            sys.exit(1)
+    if args.command in ('collect', 'run'):
+        collect(client, args.work_dir)
+
+    print_rate_limit_stats()
+    write_metrics('batch_check')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""Benchmark claim alignment on synthetic long transcripts.
+
+Usage: python scripts/bench_alignment.py [--hours 3] [--claims 300] [--seed 7]
+"""
+import argparse
+import random
+import time
+
+from alignment import ClaimAligner
+
+FILLER = "the a and of to in that it is was for on you with as we they this so but".split()
+
+def make_vocabulary(rng, size=6000):
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    return [''.join(rng.choice(letters) for _ in range(rng.randint(4, 10))) for _ in range(size)]
+
+def make_transcript(rng, hours, vocabulary, segment_seconds=3.0):
+    """Caption-like segments drawing content words from a Zipf-ish distribution."""
+    weights = [1.0 / (rank + 1) for rank in range(len(vocabulary))]
+    segments = []
+    count = int(hours * 3600 / segment_seconds)
+    for index in range(count):
+        words = []
+        for _ in range(rng.randint(7, 12)):
+            if rng.random() < 0.4:
+                words.append(rng.choice(FILLER))
+            else:
+                words.append(rng.choices(vocabulary, weights)[0])
+        segments.append({'start': round(index * segment_seconds, 2), 'text': ' '.join(words)})
+    return segments
+
+def make_claims(rng, transcript, count, vocabulary):
+    """Paraphrase-like claims lifted from spans that may cross caption boundaries."""
+    claims = []
+    for _ in range(count):
+        first = rng.randrange(len(transcript) - 3)
+        span = rng.randint(1, 3)
+        words = ' '.join(entry['text'] for entry in transcript[first:first + span]).split()
+        offset = rng.randrange(max(1, len(words) // 3))
+        words = words[offset:offset + rng.randint(8, 16)]
+        # Drop and substitute words the way a model's paraphrase would
+        words = [word for word in words if rng.random() > 0.2]
+        words = [rng.choice(vocabulary) if rng.random() < 0.1 else word for word in words]
+        claims.append({
+            'claim': ' '.join(words),
+            'truth_start': transcript[first]['start'],
+            'truth_end': transcript[min(first + span, len(transcript) - 1)]['start'],
+        })
+    return claims
+
+def legacy_match(claims, transcript_data):
+    """The first-keyword-hit matcher this engine replaced, kept for comparison."""
+    times = []
+    for claim in claims:
+        claim_text = claim['claim'].lower()
+        best_match_time = 0
+        for entry in transcript_data:
+            entry_text = entry['text'].lower()
+            if claim_text and any(word in entry_text for word in claim_text.split() if len(word) > 4):
+                best_match_time = entry['start']
+                break
+        times.append(best_match_time)
+    return times
+
+def accuracy(claims, times):
+    hits = sum(1 for claim, start in zip(claims, times) if claim['truth_start'] <= start <= claim['truth_end'])
+    return hits / len(claims)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--hours', type=float, default=3.0)
+    parser.add_argument('--claims', type=int, default=300)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocabulary = make_vocabulary(rng)
+    transcript = make_transcript(rng, args.hours, vocabulary)
+    claims = make_claims(rng, transcript, args.claims, vocabulary)
+    print(f"Synthetic transcript: {len(transcript)} segments, {args.claims} claims")
+
+    started = time.perf_counter()
+    aligner = ClaimAligner(transcript)
+    built = time.perf_counter()
+    matches = [aligner.align(claim['claim']) for claim in claims]
+    aligned = time.perf_counter()
+    times = [match['start'] if match else 0 for match in matches]
+
+    print(f"Index build:     {(built - started) * 1000:8.1f} ms")
+    print(f"Alignment:       {(aligned - built) * 1000:8.1f} ms ({(aligned - built) * 1e6 / len(claims):.0f} us/claim)")
+    print(f"Accuracy:        {accuracy(claims, times):8.1%}")
+
+    started = time.perf_counter()
+    legacy_times = legacy_match(claims, transcript)
+    elapsed = time.perf_counter() - started
+    print(f"Legacy matcher:  {elapsed * 1000:8.1f} ms, accuracy {accuracy(claims, legacy_times):.1%}")
+
+if __name__ == '__main__':
+    main()
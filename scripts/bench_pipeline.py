@@ -0,0 +1,397 @@
+"""Benchmark the fact-check pipeline end to end against local stand-ins.
+
+Scenarios, each run in a fresh child process so caches, limiters and peak
+memory do not leak between them:
+  match          match_claims_to_timestamps on a long synthetic transcript
+  process_video  process_single_issue.process_video for transcripts of several lengths
+  queue          process_queue.main over issues filed in the fake GitHub
+  batch          batch_check.py run over a manifest of the process_video transcripts
+
+The OpenAI and GitHub APIs are replaced by fake_services.py. The queue
+scenario swaps yt-dlp for the synthetic transcript generator, since YouTube
+has no stand-in. Results can be saved as a baseline and later runs compared
+against it, so a slower stage, lower throughput or higher peak memory shows up.
+
+Usage:
+  python scripts/bench_pipeline.py [--scenario all] [--save-baseline]
+  python scripts/bench_pipeline.py --fail-on-regression      # exit 1 on a regression
+"""
+import argparse
+import json
+import os
+import random
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+from bench_alignment import FILLER, make_vocabulary
+
+SCENARIOS = ('match', 'process_video', 'queue', 'batch')
+DEFAULT_BASELINE = '.cache/bench_baseline.json'
+RESULT_PREFIX = 'BENCH_RESULT '
+# Stage changes smaller than this are noise whatever the percentage
+MIN_STAGE_DELTA_SECONDS = 0.005
+CHATTER = [
+    "hey everyone welcome back to the channel", "so yeah let me know what you think in the comments",
+    "this video is sponsored by our friends use the promo code", "anyway that's pretty wild right",
+    "okay so here's the thing", "don't forget to like and subscribe", "I was reading about this the other day",
+]
+VERBS = ['reached', 'measured', 'recorded', 'grew to', 'fell to']
+# Claims with no number or name, like "vaccines cause autism"; fake_services.CLAIM_PATTERN finds both kinds
+PLAIN_VERBS = ['causes', 'cures', 'prevents', 'spreads', 'weakens', 'is linked to']
+PLAIN_CLAIM_SHARE = 0.3
+UNITS = ['metres', 'people', 'tonnes', 'dollars', 'kilometres', 'visitors']
+
+def make_talk_transcript(seed, minutes, segment_seconds=3.0, claim_share=0.15):
+    """Caption-like talk with chatter and regular factual claims. Returns (segments, claims)."""
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(rng, 2000)
+    segments = []
+    claims = []
+    for index in range(int(minutes * 60 / segment_seconds)):
+        start = round(index * segment_seconds, 2)
+        if rng.random() < claim_share:
+            if rng.random() < PLAIN_CLAIM_SHARE:
+                claim = f"{rng.choice(vocabulary)} {rng.choice(PLAIN_VERBS)} {rng.choice(vocabulary)} {rng.choice(vocabulary)}"
+            else:
+                entity = f"{rng.choice(vocabulary).capitalize()} {rng.choice(vocabulary).capitalize()}"
+                claim = f"{entity} {rng.choice(VERBS)} {rng.randint(2, 90000):,} {rng.choice(UNITS)} in {rng.randint(1900, 2024)}"
+            segments.append({'start': start, 'text': claim})
+            claims.append({'claim': claim, 'truth_start': start})
+        elif rng.random() < 0.3:
+            segments.append({'start': start, 'text': rng.choice(CHATTER)})
+        else:
+            words = [rng.choice(FILLER) if rng.random() < 0.5 else rng.choice(vocabulary) for _ in range(rng.randint(6, 11))]
+            segments.append({'start': start, 'text': ' '.join(words)})
+    return segments, claims
+
+def video_id_for(minutes, seed):
+    return f"bench-m{minutes}-s{seed}"
+
+def transcript_for_video(video_id):
+    """Deterministic synthetic transcript for a benchmark video ID."""
+    match = re.match(r'bench-m(\d+)-s(\d+)$', video_id)
+    if not match:
+        return None
+    return make_talk_transcript(int(match.group(2)), int(match.group(1)))[0]
+
+def percentile(values, fraction):
+    from metrics import percentile as metrics_percentile
+    return metrics_percentile(values, fraction)
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+def stage_summary():
+    from metrics import get_metrics
+    snapshot = get_metrics().snapshot()
+    stages = {name: {'count': summary['count'], 'p50': summary['p50'], 'p95': summary['p95'], 'total': summary['total']}
+              for name, summary in snapshot['stages'].items()}
+    return stages, snapshot['counters']
+
+def run_match(args):
+    from alignment import ClaimAligner
+    from pipeline import match_claims_to_timestamps
+    from transcript import format_transcript
+    from worthiness import filter_check_worthy
+
+    segments, claims = make_talk_transcript(args.seed, args.match_minutes)
+    rng = random.Random(args.seed)
+    # Models paraphrase: drop a word from some claims
+    queries = []
+    for claim in claims:
+        words = claim['claim'].split()
+        if rng.random() < 0.5:
+            del words[rng.randrange(len(words))]
+        queries.append({'claim': ' '.join(words), 'verdict': 'accurate', 'explanation': ''})
+
+    started = time.perf_counter()
+    _, transcript_data = format_transcript(segments)
+    aligner = ClaimAligner(transcript_data)
+    built = time.perf_counter()
+    latencies = []
+    results = []
+    for query in queries:
+        claim_started = time.perf_counter()
+        results.extend(match_claims_to_timestamps([query], transcript_data, aligner=aligner))
+        latencies.append(time.perf_counter() - claim_started)
+    elapsed = time.perf_counter() - started
+
+    hits = sum(1 for claim, result in zip(claims, results) if result['timestamp'] == claim['truth_start'])
+    # What FACT_CHECK_PREFILTER=1 would save, and how many claims it would still show the model
+    kept, prefilter = filter_check_worthy(transcript_data)
+    kept_starts = {kept.start(index) for index in range(len(kept))}
+    recalled = sum(1 for claim in claims if claim['truth_start'] in kept_starts)
+    return {
+        'items': len(queries),
+        'wall_seconds': round(elapsed, 4),
+        'throughput': round(len(queries) / elapsed, 2),
+        'latency_p50': round(percentile(latencies, 0.5), 6),
+        'latency_p95': round(percentile(latencies, 0.95), 6),
+        'index_build_seconds': round(built - started, 4),
+        'accuracy': round(hits / max(1, len(claims)), 4),
+        'segments': len(segments),
+        'prefilter_recall': round(recalled / max(1, len(claims)), 4),
+        'prefilter_saved_share': round(prefilter['saved_tokens'] / max(1, prefilter['original_tokens']), 4),
+    }
+
+def run_process_video(args):
+    from rate_limit import create_openai_client
+    import process_single_issue
+
+    client = create_openai_client('bench')
+    latencies = []
+    started = time.perf_counter()
+    for minutes in args.lengths:
+        for repeat in range(args.repeat):
+            video_id = video_id_for(minutes, args.seed + repeat)
+            video_started = time.perf_counter()
+            process_single_issue.process_video(video_id, transcript_for_video(video_id), client)
+            latencies.append(time.perf_counter() - video_started)
+    elapsed = time.perf_counter() - started
+    return {
+        'items': len(latencies),
+        'wall_seconds': round(elapsed, 4),
+        'throughput': round(len(latencies) / elapsed, 3),
+        'latency_p50': round(percentile(latencies, 0.5), 4),
+        'latency_p95': round(percentile(latencies, 0.95), 4),
+    }
+
+def run_queue(args):
+    import process_queue
+
+    # YouTube has no stand-in, so transcripts come from the generator
+    process_queue.get_transcript = transcript_for_video
+    process_queue.prefetch_transcripts = lambda video_ids: None
+    started = time.perf_counter()
+    try:
+        process_queue.main()
+    except SystemExit as e:
+        if e.code not in (None, 0):
+            raise RuntimeError(f"process_queue exited with {e.code}")
+    elapsed = time.perf_counter() - started
+
+    from metrics import get_metrics
+    latencies = get_metrics().snapshot()['stages'].get('process_video', {}).get('samples', [])
+    return {
+        'items': len(latencies),
+        'wall_seconds': round(elapsed, 4),
+        'throughput': round(len(latencies) / elapsed, 3),
+        'latency_p50': round(percentile(latencies, 0.5), 4),
+        'latency_p95': round(percentile(latencies, 0.95), 4),
+    }
+
+def run_batch(args):
+    import batch_check
+
+    manifest_path = os.path.abspath('manifest.jsonl')
+    with open(manifest_path, 'w') as f:
+        for minutes in args.lengths:
+            for repeat in range(args.repeat):
+                video_id = video_id_for(minutes, args.seed + repeat)
+                f.write(json.dumps({'video_id': video_id, 'transcript': transcript_for_video(video_id)}) + '\n')
+
+    # The real command line, with the stand-in finishing batches at once
+    sys.argv = ['batch_check.py', 'run', manifest_path, '--poll-seconds', '0.1']
+    started = time.perf_counter()
+    batch_check.main()
+    elapsed = time.perf_counter() - started
+
+    from results_store import load_result
+    items = sum(1 for minutes in args.lengths for repeat in range(args.repeat)
+                if load_result(video_id_for(minutes, args.seed + repeat)) is not None)
+    if not items:
+        raise RuntimeError("batch_check wrote no results")
+    # Every video waits for the whole batch, so its latency is the run time
+    return {
+        'items': items,
+        'wall_seconds': round(elapsed, 4),
+        'throughput': round(items / elapsed, 3),
+        'latency_p50': round(elapsed, 4),
+        'latency_p95': round(elapsed, 4),
+    }
+
+def run_child(args):
+    """Run one scenario in this process and print its result as one JSON line."""
+    runner = {'match': run_match, 'process_video': run_process_video, 'queue': run_queue, 'batch': run_batch}[args.child]
+    result = runner(args)
+    result['stages'], result['counters'] = stage_summary()
+    result['peak_rss_mb'] = peak_rss_mb()
+    print(RESULT_PREFIX + json.dumps(result))
+
+def seed_issues(github_url, repo_name, video_ids):
+    for video_id in video_ids:
+        request = urllib.request.Request(
+            f"{github_url}/repos/{repo_name}/issues",
+            data=json.dumps({'title': f"Fact-check: {video_id}"}).encode('utf-8'),
+            headers={'Content-Type': 'application/json'}, method='POST')
+        urllib.request.urlopen(request).read()
+
+def fetch_stats(url):
+    with urllib.request.urlopen(f"{url}/_stats") as response:
+        return json.load(response)
+
+def run_scenario(name, args, openai_server, github_server):
+    repo_name = 'bench/videos'
+    env = dict(os.environ, **{
+        'OPENAI_API_KEY': 'bench',
+        'OPENAI_BASE_URL': f"{openai_server.url}/v1",
+        'GITHUB_TOKEN': 'bench',
+        'GITHUB_REPOSITORY': repo_name,
+        'GITHUB_API_URL': github_server.url,
+        # Measure the uncached pipeline; every scenario starts cold
+        'FACT_CHECK_CACHE': '0',
+        'FACT_CHECK_REUSE': '0',
+        'FACT_CHECK_METRICS': '0',
+        'PYTHONPATH': os.pathsep.join(filter(None, [os.path.dirname(os.path.abspath(__file__)), os.environ.get('PYTHONPATH')])),
+    })
+    if args.stream:
+        env['FACT_CHECK_STREAM'] = '1'
+    if args.tiered:
+        env['FACT_CHECK_TIERED'] = '1'
+    if args.prefilter:
+        env['FACT_CHECK_PREFILTER'] = '1'
+    if name == 'queue':
+        seed_issues(github_server.url, repo_name,
+                    [video_id_for(args.queue_minutes, args.seed + index) for index in range(args.issues)])
+
+    command = [sys.executable, os.path.abspath(__file__), '--child', name,
+               '--seed', str(args.seed), '--repeat', str(args.repeat),
+               '--lengths', ','.join(str(length) for length in args.lengths),
+               '--match-minutes', str(args.match_minutes)]
+    with tempfile.TemporaryDirectory(prefix=f"bench-{name}-") as work_dir:
+        completed = subprocess.run(command, cwd=work_dir, env=env, capture_output=True, text=True)
+    lines = [line for line in completed.stdout.splitlines() if line.startswith(RESULT_PREFIX)]
+    if completed.returncode != 0 or not lines:
+        print(completed.stdout[-4000:])
+        print(completed.stderr[-4000:])
+        raise RuntimeError(f"Scenario {name} failed with exit code {completed.returncode}")
+    if args.verbose:
+        print(completed.stdout)
+    return json.loads(lines[-1][len(RESULT_PREFIX):])
+
+def print_result(name, result):
+    print(f"\n== {name} ==")
+    print(f"  {result['items']} items in {result['wall_seconds']:.2f}s ({result['throughput']}/s), "
+          f"latency p50 {result['latency_p50'] * 1000:.1f} ms, p95 {result['latency_p95'] * 1000:.1f} ms, "
+          f"peak RSS {result['peak_rss_mb']} MB")
+    if 'accuracy' in result:
+        print(f"  {result['segments']} segments, index build {result['index_build_seconds'] * 1000:.1f} ms, "
+              f"accuracy {result['accuracy']:.1%}")
+        print(f"  prefilter keeps {result['prefilter_recall']:.1%} of claims, "
+              f"saves {result['prefilter_saved_share']:.1%} of prompt tokens")
+    if result['stages']:
+        print(f"  {'stage':<30}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}")
+        for stage, summary in sorted(result['stages'].items()):
+            print(f"  {stage:<30}{summary['count']:>7}{summary['p50'] * 1000:>10.1f}{summary['p95'] * 1000:>10.1f}")
+    tokens = {key: value for key, value in result['counters'].items() if 'tokens' in key or 'retries' in key or key.startswith('claims_')}
+    if tokens:
+        print("  " + ', '.join(f"{key} {value}" for key, value in sorted(tokens.items())))
+
+def compare(baseline, results, tolerance):
+    """Print changes against the baseline. Returns the list of regressions."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get('scenarios', {}).get(name)
+        if base is None:
+            continue
+        checks = [('throughput', base['throughput'], result['throughput'], True),
+                  ('latency_p50', base['latency_p50'], result['latency_p50'], False),
+                  ('latency_p95', base['latency_p95'], result['latency_p95'], False),
+                  ('peak_rss_mb', base['peak_rss_mb'], result['peak_rss_mb'], False)]
+        if 'accuracy' in base:
+            checks.append(('accuracy', base['accuracy'], result['accuracy'], True))
+        if 'prefilter_recall' in base:
+            checks.append(('prefilter_recall', base['prefilter_recall'], result['prefilter_recall'], True))
+        for stage, summary in result['stages'].items():
+            if stage in base['stages']:
+                checks.append((f"stage {stage} p95", base['stages'][stage]['p95'], summary['p95'], False))
+
+        print(f"\n-- {name} vs baseline --")
+        for metric, old, new, higher_is_better in checks:
+            change = (new - old) / old if old else 0.0
+            worse = -change if higher_is_better else change
+            regressed = worse > tolerance
+            if metric.startswith('stage') and abs(new - old) < MIN_STAGE_DELTA_SECONDS:
+                regressed = False
+            if regressed:
+                regressions.append(f"{name}: {metric}")
+            print(f"  {metric:<40}{old:>12.4g}{new:>12.4g}{change:>+9.1%}{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scenario', default='all', help=f"comma-separated: {', '.join(SCENARIOS)} or all")
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--lengths', default='10,60,180', help='process_video transcript lengths in minutes')
+    parser.add_argument('--repeat', type=int, default=2, help='videos per length in process_video')
+    parser.add_argument('--issues', type=int, default=8, help='issues for the queue scenario')
+    parser.add_argument('--queue-minutes', type=int, default=20, help='transcript length of each queued video')
+    parser.add_argument('--match-minutes', type=int, default=180)
+    parser.add_argument('--stream', action='store_true', help='run with FACT_CHECK_STREAM=1')
+    parser.add_argument('--tiered', action='store_true', help='run with FACT_CHECK_TIERED=1')
+    parser.add_argument('--prefilter', action='store_true', help='run with FACT_CHECK_PREFILTER=1')
+    parser.add_argument('--openai-latency', type=float, default=0.3, help='fake seconds before the first token')
+    parser.add_argument('--token-rate', type=float, default=400.0, help='fake completion tokens per second')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of fake OpenAI requests failing')
+    parser.add_argument('--github-latency', type=float, default=0.05)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='relative change counted as a regression')
+    parser.add_argument('--fail-on-regression', action='store_true')
+    parser.add_argument('--verbose', action='store_true', help='show pipeline output')
+    parser.add_argument('--child', choices=SCENARIOS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    args.lengths = [int(length) for length in str(args.lengths).split(',') if length]
+
+    if args.child:
+        run_child(args)
+        return
+
+    from fake_services import start_servers
+
+    scenarios = SCENARIOS if args.scenario == 'all' else [name.strip() for name in args.scenario.split(',')]
+    settings = {key: getattr(args, key) for key in ('seed', 'lengths', 'repeat', 'issues', 'queue_minutes', 'match_minutes',
+                                                     'stream', 'tiered', 'prefilter', 'openai_latency', 'token_rate', 'error_rate', 'github_latency')}
+    results = {}
+    for name in scenarios:
+        # Fresh stand-ins per scenario so issue lists and error sequences repeat exactly
+        openai_server, github_server = start_servers(args.openai_latency, args.token_rate, args.error_rate,
+                                                     args.github_latency, args.seed)
+        try:
+            results[name] = run_scenario(name, args, openai_server, github_server)
+            results[name]['fake_openai'] = fetch_stats(openai_server.url)
+        finally:
+            for server in (openai_server, github_server):
+                server.shutdown()
+                server.server_close()
+        print_result(name, results[name])
+
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('settings') != settings:
+            print(f"\nBaseline {args.baseline} was recorded with different settings, not comparing")
+        else:
+            regressions = compare(baseline, results, args.tolerance)
+
+    if args.save_baseline:
+        if os.path.dirname(args.baseline):
+            os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump({'settings': settings, 'recorded_at': time.time(), 'scenarios': results}, f, indent=2)
+        print(f"\nBaseline saved to {args.baseline}")
+
+    if regressions:
+        print(f"\n{len(regressions)} regressions: " + ', '.join(regressions))
+        if args.fail_on_regression:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
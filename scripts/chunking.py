@@ -0,0 +1,241 @@
+import hashlib
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import count
+from transcript import as_transcript
+
+# Matches the per-call character budget used by fact_check_content
+DEFAULT_CHUNK_CHARS = 15000
+DEFAULT_OVERLAP_CHARS = 1000
+DEFAULT_CONCURRENCY = 4
+# Content-defined windows hold at least this share of max_chars of new text,
+# and then end on average this share later
+MIN_CORE_SHARE = 0.4
+MEAN_GAP_SHARE = 0.2
+
+def chunk_settings():
+    """Read chunking configuration from the environment."""
+    return {
+        'max_chars': int(os.environ.get('FACT_CHECK_CHUNK_CHARS', DEFAULT_CHUNK_CHARS)),
+        'overlap_chars': int(os.environ.get('FACT_CHECK_CHUNK_OVERLAP', DEFAULT_OVERLAP_CHARS)),
+        'max_workers': int(os.environ.get('FACT_CHECK_CONCURRENCY', DEFAULT_CONCURRENCY)),
+    }
+
+def _is_boundary(text, size, mean_gap):
+    # Decided by the segment's own text, so an edit elsewhere never moves this boundary.
+    # Weighting by size keeps the expected gap between boundaries near mean_gap characters
+    digest = hashlib.blake2b(text.encode('utf-8'), digest_size=4).digest()
+    return int.from_bytes(digest, 'big') / 2 ** 32 < size / mean_gap
+
+def chunk_hash(text):
+    """Content hash of a chunk's text, used to recognise it in a later run."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+
+def split_transcript(transcript_data, max_chars=DEFAULT_CHUNK_CHARS, overlap_chars=DEFAULT_OVERLAP_CHARS):
+    """Split a transcript into overlapping windows along segment boundaries.
+
+    Windows end at content-defined boundaries: after at least MIN_CORE_SHARE of
+    max_chars of new text, at the first segment whose text hashes below a
+    threshold, or where the next segment would exceed max_chars. Editing a few
+    captions therefore changes only the windows around the edit, and every
+    other window keeps its text and hash from run to run.
+    """
+    transcript = as_transcript(transcript_data)
+    chunks = []
+    total = len(transcript)
+    start = 0
+    core_start = 0
+    min_core = max_chars * MIN_CORE_SHARE
+    mean_gap = max_chars * MEAN_GAP_SHARE
+
+    def segment_size(index):
+        # Segment text plus its joining space
+        return transcript.segment_offset(index + 1) - transcript.segment_offset(index)
+
+    # Short transcripts go out whole, as one request
+    content_defined = transcript.char_count > max_chars
+
+    while start < total:
+        # Grow the window until a boundary, or until the next segment would exceed the budget
+        end = start
+        size = 0
+        core = 0
+        while end < total:
+            entry_size = segment_size(end)
+            if end > start and size + entry_size > max_chars:
+                break
+            size += entry_size
+            end += 1
+            if end > core_start:
+                core += entry_size
+            if content_defined and core >= min_core and _is_boundary(transcript.segment_lower(end - 1), entry_size, mean_gap):
+                break
+
+        window = transcript[start:end]
+        text = window.text
+        chunks.append({
+            'index': len(chunks),
+            'start': window.start(0),
+            'end': window.start(-1),
+            'text': text,
+            'hash': chunk_hash(text),
+        })
+
+        if end >= total:
+            break
+
+        # Step back so the next window repeats roughly overlap_chars of text
+        next_start = end
+        overlap = 0
+        while next_start > start + 1:
+            entry_size = segment_size(next_start - 1)
+            if overlap + entry_size > overlap_chars:
+                break
+            overlap += entry_size
+            next_start -= 1
+        start = next_start
+        core_start = end
+
+    return chunks
+
+def _claim_words(claim):
+    text = re.sub(r'[^a-z0-9 ]', ' ', claim.get('claim', '').lower())
+    return frozenset(text.split())
+
+class ClaimDeduplicator:
+    """Accepts claims one at a time, rejecting near-duplicates from overlapping windows."""
+
+    def __init__(self, similarity=0.8):
+        self.similarity = similarity
+        self.seen = []
+
+    def find(self, claim):
+        """Index, in acceptance order, of an accepted claim this one duplicates, or None."""
+        words = _claim_words(claim)
+        for index, other in enumerate(self.seen):
+            if words == other:
+                return index
+            if words and other and len(words & other) / len(words | other) >= self.similarity:
+                return index
+        return None
+
+    def add(self, claim):
+        if not isinstance(claim, dict) or self.find(claim) is not None:
+            return False
+
+        self.seen.append(_claim_words(claim))
+        return True
+
+def merge_claim_lists(claim_lists, similarity=0.8):
+    """Merge per-chunk claim lists, dropping duplicates from overlapping windows.
+
+    Also returns, for each list, the indexes in the merged list of the claims
+    it produced, including the ones it duplicated.
+    """
+    deduplicator = ClaimDeduplicator(similarity)
+    merged = []
+    indexes = []
+
+    for claims in claim_lists:
+        if isinstance(claims, dict):
+            claims = [claims]
+
+        produced = []
+        for claim in claims or []:
+            if not isinstance(claim, dict):
+                continue
+            index = deduplicator.find(claim)
+            if index is None:
+                deduplicator.add(claim)
+                index = len(merged)
+                merged.append(claim)
+            if index not in produced:
+                produced.append(index)
+        indexes.append(produced)
+
+    return merged, indexes
+
+def merge_claims(claim_lists, similarity=0.8):
+    """Merge per-chunk claim lists, dropping duplicates from overlapping windows."""
+    return merge_claim_lists(claim_lists, similarity)[0]
+
+def carry_claims(previous_chunk, chunk):
+    """Aligned claims of an unchanged chunk from an earlier run, moved with the chunk if its timing shifted.
+
+    They are flagged 'carried' so alignment passes them through; the flag is
+    dropped again before results are saved.
+    """
+    shift = chunk['start'] - previous_chunk['start']
+    carried = []
+    for claim in previous_chunk['claims']:
+        claim = dict(claim, carried=True)
+        if shift:
+            claim['timestamp'] += shift
+            if claim.get('end'):
+                claim['end'] += shift
+        carried.append(claim)
+    return carried
+
+def fact_check_chunked(transcript_data, client, check_fn, max_chars=None, overlap_chars=None, max_workers=None, on_claim=None, previous=None, chunk_log=None):
+    """Fact-check a whole transcript by fanning chunks out to check_fn concurrently.
+
+    When on_claim is given it is passed through to check_fn, which calls it for
+    each claim as soon as the model has produced it.
+
+    previous maps chunk hashes from an earlier run to {'start', 'claims'}
+    records; those chunks are not sent again and their claims are carried
+    over. When chunk_log is a list, a {'hash', 'start', 'claims'} record is
+    appended for every chunk, with claims as indexes into the returned list.
+    """
+    settings = chunk_settings()
+    if max_chars is None:
+        max_chars = settings['max_chars']
+    if overlap_chars is None:
+        overlap_chars = settings['overlap_chars']
+    if max_workers is None:
+        max_workers = settings['max_workers']
+    previous = previous or {}
+
+    chunks = split_transcript(transcript_data, max_chars, overlap_chars)
+    if not chunks:
+        return []
+
+    def check_chunk(chunk):
+        if on_claim is None:
+            return check_fn(chunk['text'], client)
+        return check_fn(chunk['text'], client, on_claim=on_claim)
+
+    fresh = [chunk for chunk in chunks if chunk['hash'] not in previous]
+    count('chunks_checked', len(fresh))
+    count('chunks_carried', len(chunks) - len(fresh))
+    if previous:
+        print(f"Re-checking {len(fresh)} of {len(chunks)} chunks, the rest are unchanged since the last run")
+
+    outputs = {}
+    if len(fresh) == 1:
+        outputs[fresh[0]['index']] = check_chunk(fresh[0])
+    elif fresh:
+        workers = max(1, min(max_workers, len(fresh)))
+        print(f"Fact-checking {len(fresh)} chunks with {workers} concurrent requests")
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            outputs = dict(zip((chunk['index'] for chunk in fresh), executor.map(check_chunk, fresh)))
+
+    claim_lists = []
+    for chunk in chunks:
+        if chunk['index'] in outputs:
+            claim_lists.append(outputs[chunk['index']])
+            continue
+        carried = carry_claims(previous[chunk['hash']], chunk)
+        if on_claim is not None:
+            for claim in carried:
+                on_claim(claim)
+        claim_lists.append(carried)
+
+    merged, indexes = merge_claim_lists(claim_lists)
+    if chunk_log is not None:
+        for chunk, produced in zip(chunks, indexes):
+            chunk_log.append({'hash': chunk['hash'], 'start': chunk['start'], 'claims': produced})
+    return merged
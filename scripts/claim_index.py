@@ -0,0 +1,246 @@
+import fcntl
+import hashlib
+import json
+import os
+import threading
+from collections import defaultdict
+
+from alignment import tokenize, tokenize_lowered
+from results_store import iter_results
+from transcript import as_transcript
+
+DEFAULT_INDEX_PATH = '.cache/claim_index.json'
+DEFAULT_REUSE_THRESHOLD = 0.8
+# Shorter claims are too generic to reuse safely
+MIN_SHINGLES = 3
+# Most captions a reused claim may be spread across
+MAX_SPAN = 6
+REUSABLE_VERDICTS = frozenset(['accurate', 'inaccurate', 'misleading', 'unverifiable'])
+
+def shingle(a, b):
+    return hashlib.blake2b(f"{a} {b}".encode('utf-8'), digest_size=8).hexdigest()
+
+def claim_shingles(text):
+    """Fingerprint a claim as the set of hashed word bigrams of its normalized text."""
+    tokens = tokenize(text)
+    return sorted(set(shingle(a, b) for a, b in zip(tokens, tokens[1:])))
+
+def claim_key(text):
+    """Exact fingerprint used to collapse repeated claims across videos."""
+    return hashlib.blake2b(' '.join(tokenize(text)).encode('utf-8'), digest_size=8).hexdigest()
+
+class ClaimIndex:
+    """Verdicts from earlier results, searchable by claim shingles."""
+
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        self.path = path
+        self.claims = {}
+        self.sources = {}
+        self.postings = defaultdict(set)
+        # Videos indexed here since the last save; other processes' copies of them lose on merge
+        self._dirty = set()
+        self._lock = threading.Lock()
+
+        if path and os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            self.sources = data.get('sources', {})
+            for key, claim in data.get('claims', {}).items():
+                self._insert(key, claim)
+
+    def _insert(self, key, claim):
+        self.claims[key] = claim
+        for value in claim['shingles']:
+            self.postings[value].add(key)
+
+    def _remove_videos(self, video_ids):
+        for key in [key for key, claim in self.claims.items() if claim['video_id'] in video_ids]:
+            for value in self.claims.pop(key)['shingles']:
+                self.postings[value].discard(key)
+
+    def add_result(self, video_id, claims):
+        """Index the reusable claims from one video's results, replacing any earlier ones."""
+        with self._lock:
+            self._remove_videos({video_id})
+            self._dirty.add(video_id)
+
+            added = 0
+            for claim in claims:
+                text = claim.get('claim', '')
+                shingles = claim_shingles(text)
+                if claim.get('verdict') not in REUSABLE_VERDICTS or len(shingles) < MIN_SHINGLES:
+                    continue
+                key = claim_key(text)
+                if key in self.claims:
+                    continue
+                self._insert(key, {
+                    'claim': text,
+                    'verdict': claim['verdict'],
+                    'explanation': claim.get('explanation', ''),
+                    'video_id': video_id,
+                    'shingles': shingles,
+                })
+                added += 1
+            return added
+
+    def update_from_results(self):
+        """Index stored results that are new or changed since the last update."""
+        added = 0
+        for video_id, raw in iter_results():
+            # Checkouts reset mtimes, so compare content digests instead
+            digest = hashlib.blake2b(raw, digest_size=16).hexdigest()
+            if self.sources.get(video_id) == digest:
+                continue
+            try:
+                data = json.loads(raw)
+            except ValueError as e:
+                print(f"Skipping unreadable result for {video_id}: {e}")
+                continue
+            added += self.add_result(video_id, data.get('claims', []))
+            self.sources[video_id] = digest
+        return added
+
+    def _merge_saved(self):
+        """Take in videos that other processes indexed and saved since this index was loaded."""
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return
+        sources = data.get('sources', {})
+        changed = set(video_id for video_id, digest in sources.items()
+                      if video_id not in self._dirty and self.sources.get(video_id) != digest)
+        changed.update(claim['video_id'] for claim in data.get('claims', {}).values()
+                       if claim['video_id'] not in self._dirty and claim['video_id'] not in self.sources)
+        if not changed:
+            return
+
+        self._remove_videos(changed)
+        for key, claim in data.get('claims', {}).items():
+            if claim['video_id'] in changed and key not in self.claims:
+                self._insert(key, claim)
+        for video_id in changed:
+            if video_id in sources:
+                self.sources[video_id] = sources[video_id]
+
+    def save(self):
+        """Write the index, merged with what other processes (such as backfill workers) saved meanwhile."""
+        if not self.path:
+            return
+        with self._lock:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(f"{self.path}.lock", 'w') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                self._merge_saved()
+                tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp_path, 'w') as f:
+                    json.dump({'sources': self.sources, 'claims': self.claims}, f, separators=(',', ':'))
+                os.replace(tmp_path, self.path)
+            self._dirty.clear()
+
+    def reuse_known_claims(self, transcript_data, threshold=DEFAULT_REUSE_THRESHOLD, exclude_video=None):
+        """Split a transcript into reused verdicts and the segments still needing a model check.
+
+        Claims indexed under exclude_video are ignored, so re-checking a video
+        does not match its own earlier claims.
+        """
+        transcript = as_transcript(transcript_data)
+        # Shingles run across caption boundaries and belong to the segment of their second word
+        positions = defaultdict(list)
+        previous = None
+        for index in range(len(transcript)):
+            for token in tokenize_lowered(transcript.segment_lower(index)):
+                if previous is not None:
+                    positions[shingle(previous, token)].append(index)
+                previous = token
+
+        with self._lock:
+            hits = defaultdict(list)
+            for value, segments in positions.items():
+                for key in self.postings.get(value, ()):
+                    for index in segments:
+                        hits[key].append((index, value))
+
+            reused = []
+            consumed = set()
+            for key, claim_hits in hits.items():
+                claim = self.claims[key]
+                if claim['video_id'] == exclude_video:
+                    continue
+                needed = threshold * len(claim['shingles'])
+                if len(set(value for _, value in claim_hits)) < needed:
+                    continue
+
+                window = self._best_window(sorted(claim_hits), needed)
+                if window is None:
+                    continue
+                first, last = window
+                consumed.update(range(first, last + 1))
+                reused.append({
+                    'claim': claim['claim'],
+                    'verdict': claim['verdict'],
+                    'explanation': claim['explanation'],
+                    'context': transcript[first:last + 1].text,
+                    'reused_from': claim['video_id'],
+                })
+
+        if not consumed:
+            return reused, transcript
+        return reused, transcript.select(index for index in range(len(transcript)) if index not in consumed)
+
+    @staticmethod
+    def _best_window(claim_hits, needed):
+        # Smallest run of at most MAX_SPAN captions containing enough distinct shingles
+        best = None
+        left = 0
+        counts = defaultdict(int)
+        for right in range(len(claim_hits)):
+            counts[claim_hits[right][1]] += 1
+            while claim_hits[right][0] - claim_hits[left][0] >= MAX_SPAN:
+                counts[claim_hits[left][1]] -= 1
+                if not counts[claim_hits[left][1]]:
+                    del counts[claim_hits[left][1]]
+                left += 1
+            if len(counts) >= needed:
+                span = (claim_hits[left][0], claim_hits[right][0])
+                if best is None or span[1] - span[0] < best[1] - best[0]:
+                    best = span
+        return best
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_claim_index():
+    """Shared index configured from the environment, or None when reuse is disabled."""
+    global _index
+    if os.environ.get('FACT_CHECK_REUSE', '1') == '0':
+        return None
+    with _index_lock:
+        if _index is None:
+            _index = ClaimIndex(os.environ.get('FACT_CHECK_CLAIM_INDEX_PATH', DEFAULT_INDEX_PATH))
+            added = _index.update_from_results()
+            if added:
+                print(f"Claim index: added {added} claims from existing results")
+                _index.save()
+        return _index
+
+def split_known_claims(transcript_data, exclude_video=None):
+    """Reuse verdicts for claims already checked elsewhere; return them and the unchecked segments."""
+    index = get_claim_index()
+    if index is None:
+        return [], transcript_data
+
+    threshold = float(os.environ.get('FACT_CHECK_REUSE_THRESHOLD', DEFAULT_REUSE_THRESHOLD))
+    reused, remaining = index.reuse_known_claims(transcript_data, threshold, exclude_video)
+    if reused:
+        print(f"Reusing {len(reused)} verdicts from earlier videos, skipping {len(transcript_data) - len(remaining)} transcript segments")
+    return reused, remaining
+
+def record_result(video_id, claims):
+    """Add a freshly written result to the index so later videos can reuse it."""
+    index = get_claim_index()
+    if index is not None:
+        # Claims reused from other videos are already indexed under the video they came from
+        index.add_result(video_id, [claim for claim in claims if claim.get('reused_from') in (None, video_id)])
+        index.save()
@@ -0,0 +1,77 @@
+import os
+import re
+
+# Non-speech caption tags such as [Music], (applause) or ♪ runs
+TAG_PATTERN = re.compile(r'\[[^\]]*\]|\((?:music|applause|laughter|laughs|inaudible|silence)\)|[♪♫]+', re.IGNORECASE)
+FILLER_PATTERN = re.compile(r'\b(?:um+|uh+|uhm|erm|hmm+|mm+|ah)\b[,.]?\s*', re.IGNORECASE)
+# How far back a rolling caption may repeat earlier words
+MAX_OVERLAP_WORDS = 40
+# Single-word repeats across lines are usually real speech ("...and / and then")
+MIN_OVERLAP_WORDS = 2
+
+def clean_text(text):
+    """Strip non-speech tags and filler words from one caption line."""
+    text = TAG_PATTERN.sub(' ', text)
+    text = FILLER_PATTERN.sub('', text)
+    return ' '.join(text.split())
+
+def _overlap(tail, words):
+    # Longest prefix of words that repeats the end of the text already emitted
+    limit = min(len(tail), len(words))
+    for size in range(limit, MIN_OVERLAP_WORDS - 1, -1):
+        if tail[-size:] == words[:size]:
+            return size
+    return 0
+
+def compact_transcript(transcript):
+    """Collapse rolling-caption repeats and noise. Returns (compacted entries, stats).
+
+    Each compacted entry keeps the start time of the first original entry it
+    covers and an 'original' [first, last] index range into the input.
+    """
+    compacted = []
+    tail = []
+    original_chars = 0
+
+    for index, entry in enumerate(transcript):
+        original_chars += len(entry['text'])
+        words = clean_text(entry['text']).split()
+        if not words:
+            continue
+
+        lowered = [word.lower() for word in words]
+        overlap = _overlap(tail, lowered)
+        new_words = words[overlap:]
+
+        if not new_words:
+            # Fully repeated caption: it only extends the previous entry
+            if compacted:
+                compacted[-1]['original'][1] = index
+            continue
+
+        compacted.append({
+            'start': entry['start'],
+            'text': ' '.join(new_words),
+            'original': [index, index],
+        })
+        tail = (tail + lowered[overlap:])[-MAX_OVERLAP_WORDS:]
+
+    compacted_chars = sum(len(entry['text']) for entry in compacted)
+    stats = {
+        'original_entries': len(transcript),
+        'compacted_entries': len(compacted),
+        'original_chars': original_chars,
+        'compacted_chars': compacted_chars,
+        'reduction': 1 - compacted_chars / original_chars if original_chars else 0.0,
+    }
+    return compacted, stats
+
+def compact_for_prompt(transcript):
+    """Compact a transcript unless FACT_CHECK_COMPACT=0, printing how much it shrank."""
+    if os.environ.get('FACT_CHECK_COMPACT', '1') == '0':
+        return transcript
+
+    compacted, stats = compact_transcript(transcript)
+    print(f"Compacted transcript: {stats['original_entries']} -> {stats['compacted_entries']} entries, "
+          f"{stats['original_chars']} -> {stats['compacted_chars']} characters ({stats['reduction']:.0%} smaller)")
+    return compacted
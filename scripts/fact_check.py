@@ -1,7 +1,17 @@
 import os
 import json
 from youtube_transcript_api import YouTubeTranscriptApi
-from openai import OpenAI
+from chunking import fact_check_chunked
+from alignment import ClaimAligner
+from transcript import format_transcript
+from llm_cache import cached_completion, print_cache_stats
+from rate_limit import create_openai_client, print_rate_limit_stats
+from timeline import sort_claims, build_timeline
+from results_store import save_result
+
+MODEL = "gpt-4o-mini"
+TEMPERATURE = 0.3
+SYSTEM_PROMPT = "You are a fact-checker. Analyze the provided transcript and identify claims that need fact-checking. For each claim, provide: the claim text, whether it's accurate/inaccurate/misleading/unverifiable, a brief explanation, and an approximate timestamp reference if you can infer it from context. Return as JSON array with format: [{\"claim\": \"text\", \"verdict\": \"accurate/inaccurate/misleading/unverifiable\", \"explanation\": \"brief explanation\", \"context\": \"surrounding context from transcript\"}]"
 
 def get_transcript(video_id):
     """Fetch transcript for a YouTube video."""
@@ -12,35 +22,20 @@ def get_transcript(video_id):
         print(f"Error fetching transcript: {e}")
         return None
 
-def format_transcript(transcript):
-    """Convert transcript to readable text with timestamps."""
-    if not transcript:
-        return None
-    
-    formatted = []
-    for entry in transcript:
-        formatted.append({
-            'start': entry['start'],
-            'text': entry['text']
-        })
-    
-    # Combine into full text for fact-checking
-    full_text = ' '.join([entry['text'] for entry in transcript])
-    return full_text, formatted
-
 def fact_check_content(text, client):
     """Use OpenAI to fact-check the content."""
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
+        # Identical requests are answered from the local response cache
+        result = cached_completion(
+            client,
+            model=MODEL,
             messages=[
-                {"role": "system", "content": "You are a fact-checker. Analyze the provided transcript and identify claims that need fact-checking. For each claim, provide: the claim text, whether it's accurate/inaccurate/misleading/unverifiable, a brief explanation, and an approximate timestamp reference if you can infer it from context. Return as JSON array with format: [{\"claim\": \"text\", \"verdict\": \"accurate/inaccurate/misleading/unverifiable\", \"explanation\": \"brief explanation\", \"context\": \"surrounding context from transcript\"}]"},
-                {"role": "user", "content": f"Fact-check this video transcript:\n\n{text[:15000]}"}  # Limit to avoid token limits
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": f"Fact-check this video transcript:\n\n{text}"}
             ],
-            temperature=0.3
+            temperature=TEMPERATURE
         )
         
-        result = response.choices[0].message.content
         # Try to parse as JSON
         try:
             claims = json.loads(result)
@@ -55,30 +50,17 @@ def fact_check_content(text, client):
 
 def match_claims_to_timestamps(claims, transcript_data):
     """Match fact-checked claims back to transcript timestamps."""
+    aligner = ClaimAligner(transcript_data)
     results = []
     
     for claim in claims:
-        # Try to find the claim text in the transcript
-        claim_text = claim.get('claim', '').lower()
-        context_text = claim.get('context', '').lower()
-        
-        best_match_time = 0
-        best_match_score = 0
-        
-        # Search for matches in transcript
-        for entry in transcript_data:
-            entry_text = entry['text'].lower()
-            
-            # Simple matching - look for claim keywords in transcript
-            if claim_text and any(word in entry_text for word in claim_text.split() if len(word) > 4):
-                best_match_time = entry['start']
-                break
-            elif context_text and context_text[:50] in entry_text:
-                best_match_time = entry['start']
-                break
+        # Unmatched claims fall back to the start of the video
+        match = aligner.align(claim.get('claim', ''), claim.get('context', ''))
         
         results.append({
-            'timestamp': best_match_time,
+            'timestamp': match['start'] if match else 0,
+            'end': match['end'] if match else 0,
+            'confidence': match['confidence'] if match else 0.0,
             'claim': claim.get('claim', ''),
             'verdict': claim.get('verdict', 'unverified'),
             'explanation': claim.get('explanation', '')
@@ -97,7 +79,7 @@ def main():
     print(f"Processing video: {video_id}")
     
     # Initialize OpenAI client
-    client = OpenAI(api_key=api_key)
+    client = create_openai_client(api_key)
     
     # Get transcript
     transcript = get_transcript(video_id)
@@ -109,25 +91,24 @@ def main():
     full_text, transcript_data = format_transcript(transcript)
     print(f"Transcript length: {len(full_text)} characters")
     
-    # Fact check
-    claims = fact_check_content(full_text, client)
+    # Fact check the whole transcript in overlapping chunks
+    claims = fact_check_chunked(transcript_data, client, fact_check_content)
     print(f"Found {len(claims)} claims to check")
     
     # Match to timestamps
-    results = match_claims_to_timestamps(claims, transcript_data)
-    
-    # Save results
-    output_path = f"results/{video_id}.json"
-    os.makedirs("results", exist_ok=True)
+    results, _ = sort_claims(match_claims_to_timestamps(claims, transcript_data))
     
-    with open(output_path, 'w') as f:
-        json.dump({
-            'video_id': video_id,
-            'processed_at': None,  # GitHub Actions will add timestamp via commit
-            'claims': results
-        }, f, indent=2)
+    # Stage results for the sharded store
+    output_path = save_result(video_id, {
+        'video_id': video_id,
+        'processed_at': None,  # GitHub Actions will add timestamp via commit
+        'claims': results,
+        'timeline': build_timeline(results)
+    })
     
     print(f"Results saved to {output_path}")
+    print_cache_stats()
+    print_rate_limit_stats()
 
 if __name__ == "__main__":
     main()
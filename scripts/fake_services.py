@@ -0,0 +1,437 @@
+"""Local stand-ins for the OpenAI chat API and the GitHub issues API.
+
+Used by bench_pipeline.py so the whole pipeline, batch mode included, can
+be timed without network access or API spend. The fake model "finds" claims with a regex
+over the synthetic transcripts bench_pipeline.py generates.
+
+Usage: python scripts/fake_services.py [--latency 0.3] [--token-rate 400] [--error-rate 0.02]
+Point the scripts at it with OPENAI_BASE_URL=<openai url> and GITHUB_API_URL=<github url>.
+GET /_stats on either server returns its request and error counts.
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Sentences bench_pipeline.make_talk_transcript emits as factual claims: named figures, and
+# plain lowercase claims with no number or name, as auto-captions give them
+CLAIM_PATTERN = re.compile(r"\b[A-Z][a-z]+ [A-Z][a-z]+ (?:reached|measured|recorded|grew to|fell to) [\d,]+ [a-z]+ in \d{4}\b"
+                           r"|\b[a-z]+ (?:causes|cures|prevents|spreads|weakens|is linked to) [a-z]+ [a-z]+\b")
+VERDICTS = ['accurate', 'inaccurate', 'misleading', 'unverifiable']
+MAX_CLAIMS_PER_CHUNK = 20
+
+def _now():
+    return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+class _JSONHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}') if length else {}
+
+    def _send(self, status, payload=None, headers=None):
+        data = b'' if payload is None else json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+class FakeOpenAIHandler(_JSONHandler):
+    """Chat completions with configurable latency, token rate and injected errors, plus the
+    Files and Batches endpoints batch_check.py uses. Batches complete in the background at once."""
+
+    def do_GET(self):
+        parts = [part for part in urlparse(self.path).path.split('/') if part]
+        if parts == ['_stats']:
+            self._send(200, self.server.stats)
+        elif len(parts) == 4 and parts[1] == 'files' and parts[3] == 'content':
+            content = self.server.files.get(parts[2], {}).get('content')
+            if content is None:
+                self._send(404, {'error': {'message': f"No such file {parts[2]}"}})
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/octet-stream')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+        elif len(parts) == 3 and parts[1] == 'batches' and parts[2] in self.server.batches:
+            with self.server.lock:
+                self._send(200, dict(self.server.batches[parts[2]]))
+        else:
+            self._send(404, {'error': {'message': f"unknown path {self.path}"}})
+
+    def do_POST(self):
+        path = urlparse(self.path).path.rstrip('/')
+        if path.endswith('/files'):
+            self._create_file()
+            return
+        if path.endswith('/batches'):
+            self._create_batch(self._body())
+            return
+        request = self._body()
+        if not path.endswith('/chat/completions'):
+            self._send(404, {'error': {'message': f"unknown path {self.path}"}})
+            return
+
+        self.server.count('requests')
+        error = self._injected_error()
+        if error is not None:
+            self._send(*error)
+            return
+
+        content, prompt_tokens, completion_tokens = self._answer(request)
+        generation_seconds = completion_tokens / self.server.config['token_rate']
+        time.sleep(self.server.config['latency'])
+
+        if request.get('stream'):
+            self._stream(request, content, prompt_tokens, completion_tokens, generation_seconds)
+            return
+
+        time.sleep(generation_seconds)
+        self._send(200, self._completion(request, content, prompt_tokens, completion_tokens))
+
+    def _injected_error(self):
+        """(status, body, headers) for a request picked to fail, else None."""
+        config = self.server.config
+        if config['rng'].random() >= config['error_rate']:
+            return None
+        self.server.count('errors')
+        if config['rng'].random() < 0.5:
+            return 429, {'error': {'message': 'Rate limit reached (fake)', 'type': 'rate_limit_error'}}, {'retry-after': '0'}
+        return 500, {'error': {'message': 'Internal error (fake)', 'type': 'server_error'}}, None
+
+    def _answer(self, request):
+        """The fake model's reply to a chat request. Returns (content, prompt_tokens, completion_tokens)."""
+        config = self.server.config
+        prompt = request['messages'][-1]['content']
+        system = request['messages'][0]['content'] if len(request['messages']) > 1 else ''
+        if 'JSON object' in system:
+            # Second opinion on one claim from the strong tier (see routing.py)
+            content = json.dumps({'verdict': config['rng'].choice(VERDICTS), 'confidence': 0.9,
+                                  'explanation': 'Synthetic second opinion from the benchmark stand-in.'})
+        else:
+            claims = []
+            for index, match in enumerate(CLAIM_PATTERN.finditer(prompt)):
+                if index >= MAX_CLAIMS_PER_CHUNK:
+                    break
+                claims.append({
+                    'claim': match.group(0),
+                    'verdict': VERDICTS[index % len(VERDICTS)],
+                    'explanation': 'Synthetic verdict from the benchmark stand-in.',
+                    'context': match.group(0),
+                })
+                if '"confidence"' in system:
+                    claims[-1]['confidence'] = round(config['rng'].uniform(0.5, 1.0), 2)
+            content = json.dumps(claims)
+        prompt_tokens = sum(len(message['content']) for message in request['messages']) // 4
+        return content, prompt_tokens, max(1, len(content) // 4)
+
+    @staticmethod
+    def _completion(request, content, prompt_tokens, completion_tokens):
+        return {
+            'id': 'chatcmpl-fake',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': request.get('model'),
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+            'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                      'total_tokens': prompt_tokens + completion_tokens},
+        }
+
+    def _store_file(self, content, filename, purpose):
+        with self.server.lock:
+            file_id = f"file-fake{len(self.server.files) + 1}"
+            self.server.files[file_id] = {'content': content, 'object': {
+                'id': file_id, 'object': 'file', 'bytes': len(content), 'created_at': int(time.time()),
+                'filename': filename, 'purpose': purpose, 'status': 'processed'}}
+        return self.server.files[file_id]['object']
+
+    def _create_file(self):
+        # multipart/form-data with a purpose field and the file itself
+        boundary = re.search(r'boundary="?([^";]+)"?', self.headers.get('Content-Type', ''))
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if boundary is None:
+            self._send(400, {'error': {'message': 'expected a multipart upload'}})
+            return
+        fields = {}
+        for part in body.split(b'--' + boundary.group(1).encode())[1:-1]:
+            head, _, value = part[2:-2].partition(b'\r\n\r\n')
+            name = re.search(rb'name="([^"]*)"', head)
+            filename = re.search(rb'filename="([^"]*)"', head)
+            if name:
+                fields[name.group(1).decode()] = (value, filename.group(1).decode() if filename else None)
+        if 'file' not in fields:
+            self._send(400, {'error': {'message': 'no file in upload'}})
+            return
+        content, filename = fields['file']
+        self._send(200, self._store_file(content, filename, fields.get('purpose', (b'batch',))[0].decode()))
+
+    def _create_batch(self, body):
+        source = self.server.files.get(body.get('input_file_id'))
+        if source is None:
+            self._send(404, {'error': {'message': f"No such file {body.get('input_file_id')}"}})
+            return
+        lines = [json.loads(line) for line in source['content'].decode('utf-8').splitlines() if line.strip()]
+        with self.server.lock:
+            batch_id = f"batch_fake{len(self.server.batches) + 1}"
+            batch = self.server.batches[batch_id] = {
+                'id': batch_id, 'object': 'batch', 'endpoint': body.get('endpoint'), 'errors': None,
+                'input_file_id': body['input_file_id'], 'completion_window': body.get('completion_window', '24h'),
+                'status': 'in_progress', 'output_file_id': None, 'error_file_id': None,
+                'created_at': int(time.time()), 'in_progress_at': int(time.time()),
+                'request_counts': {'total': len(lines), 'completed': 0, 'failed': 0},
+            }
+            response = dict(batch)
+        threading.Thread(target=self._run_batch, args=(batch_id, lines), daemon=True).start()
+        self._send(200, response)
+
+    def _run_batch(self, batch_id, lines):
+        time.sleep(self.server.config['latency'])
+        outputs, errors = [], []
+        for line in lines:
+            self.server.count('requests')
+            error = self._injected_error()
+            if error is not None:
+                status, body, _ = error
+                errors.append({'id': f"batch_req_{len(errors)}", 'custom_id': line['custom_id'],
+                               'response': {'status_code': status, 'body': body}, 'error': None})
+                continue
+            content, prompt_tokens, completion_tokens = self._answer(line['body'])
+            outputs.append({'id': f"batch_req_{len(outputs)}", 'custom_id': line['custom_id'], 'error': None,
+                            'response': {'status_code': 200, 'body': self._completion(line['body'], content, prompt_tokens, completion_tokens)}})
+
+        def jsonl(records):
+            return ''.join(json.dumps(record) + '\n' for record in records).encode('utf-8')
+
+        output_file = self._store_file(jsonl(outputs), 'batch_output.jsonl', 'batch_output') if outputs else None
+        error_file = self._store_file(jsonl(errors), 'batch_errors.jsonl', 'batch_output') if errors else None
+        with self.server.lock:
+            self.server.batches[batch_id].update({
+                'status': 'completed', 'completed_at': int(time.time()),
+                'output_file_id': output_file and output_file['id'], 'error_file_id': error_file and error_file['id'],
+                'request_counts': {'total': len(lines), 'completed': len(outputs), 'failed': len(errors)},
+            })
+
+    def _stream(self, request, content, prompt_tokens, completion_tokens, generation_seconds):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+
+        pieces = [content[i:i + 16] for i in range(0, len(content), 16)] or ['']
+        base = {'id': 'chatcmpl-fake', 'object': 'chat.completion.chunk', 'created': int(time.time()),
+                'model': request.get('model')}
+        for piece in pieces:
+            time.sleep(generation_seconds / len(pieces))
+            event = dict(base, choices=[{'index': 0, 'delta': {'content': piece}, 'finish_reason': None}])
+            self.wfile.write(f"data: {json.dumps(event)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+        if (request.get('stream_options') or {}).get('include_usage'):
+            usage = {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                     'total_tokens': prompt_tokens + completion_tokens}
+            self.wfile.write(f"data: {json.dumps(dict(base, choices=[], usage=usage))}\n\n".encode('utf-8'))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+class FakeGitHubHandler(_JSONHandler):
+    """The slice of the REST API the scripts use: repos, issues, comments and rate limits."""
+
+    def _url(self, path):
+        return f"http://{self.server.server_address[0]}:{self.server.server_address[1]}{path}"
+
+    def _issue_json(self, owner, repo, issue):
+        url = self._url(f"/repos/{owner}/{repo}/issues/{issue['number']}")
+        return dict(issue, url=url, html_url=url, comments_url=f"{url}/comments",
+                    labels=[{'name': name} for name in issue['labels']], user={'login': 'bench'})
+
+    def _route(self):
+        parsed = urlparse(self.path)
+        parts = [part for part in parsed.path.split('/') if part]
+        return parsed, parts
+
+    def _rate_headers(self):
+        with self.server.lock:
+            self.server.stats['remaining'] -= 1
+            remaining = self.server.stats['remaining']
+        return {'X-RateLimit-Limit': '5000', 'X-RateLimit-Remaining': str(remaining),
+                'X-RateLimit-Reset': str(int(time.time()) + 3600)}
+
+    def do_GET(self):
+        parsed, parts = self._route()
+        if parts == ['_stats']:
+            self._send(200, self.server.stats)
+            return
+        time.sleep(self.server.config['latency'])
+        self.server.count('requests')
+
+        if parts == ['rate_limit']:
+            core = {'limit': 5000, 'remaining': self.server.stats['remaining'], 'reset': int(time.time()) + 3600, 'used': 0}
+            self._send(200, {'resources': {'core': core, 'search': core}, 'rate': core})
+            return
+        if parts == ['search', 'issues']:
+            self._search_issues(parse_qs(parsed.query).get('q', [''])[0])
+            return
+        if len(parts) == 3 and parts[0] == 'repos':
+            owner, repo = parts[1], parts[2]
+            self._send(200, {'id': 1, 'name': repo, 'full_name': f"{owner}/{repo}", 'owner': {'login': owner},
+                             'url': self._url(f"/repos/{owner}/{repo}"), 'private': False}, self._rate_headers())
+            return
+        if len(parts) == 4 and parts[3] == 'issues':
+            self._list_issues(parts[1], parts[2], parse_qs(parsed.query))
+            return
+        if len(parts) == 5 and parts[3] == 'issues':
+            issue = self.server.issues.get(int(parts[4]))
+            if issue is None:
+                self._send(404, {'message': 'Not Found'})
+            else:
+                self._send(200, self._issue_json(parts[1], parts[2], issue), self._rate_headers())
+            return
+        self._send(404, {'message': 'Not Found'})
+
+    def _search_issues(self, query):
+        # Enough of the search syntax for the scripts' queries: repo:, is:open and a quoted title phrase
+        repo_name = re.search(r'repo:(\S+)', query).group(1)
+        phrase = re.search(r'"([^"]*)"', query)
+        with self.server.lock:
+            issues = [issue for issue in self.server.issues.values()
+                      if ('is:open' not in query or issue['state'] == 'open')
+                      and (phrase is None or phrase.group(1).lower() in issue['title'].lower())]
+        owner, repo = repo_name.split('/', 1)
+        self._send(200, {'total_count': len(issues), 'incomplete_results': False,
+                         'items': [self._issue_json(owner, repo, issue) for issue in issues]}, self._rate_headers())
+
+    def _list_issues(self, owner, repo, query):
+        state = query.get('state', ['open'])[0]
+        labels = set(query['labels'][0].split(',')) if query.get('labels') else set()
+        since = query.get('since', [None])[0]
+        with self.server.lock:
+            issues = [issue for issue in self.server.issues.values()
+                      if (state == 'all' or issue['state'] == state)
+                      and labels <= set(issue['labels'])
+                      and (since is None or issue['updated_at'] >= since.replace('+00:00', 'Z'))]
+        issues.sort(key=lambda issue: issue['updated_at'], reverse=True)
+
+        per_page = int(query.get('per_page', ['30'])[0])
+        page = int(query.get('page', ['1'])[0])
+        if per_page == 1:
+            # The conditional probe in issue_discovery.py
+            digest = hashlib.sha1(json.dumps([(i['number'], i['updated_at']) for i in issues]).encode()).hexdigest()
+            etag = f'W/"{digest}"'
+            if self.headers.get('If-None-Match') == etag:
+                self._send(304, None, {'ETag': etag})
+                return
+            self._send(200, [self._issue_json(owner, repo, issue) for issue in issues[:1]],
+                       dict(self._rate_headers(), ETag=etag))
+            return
+
+        page_items = issues[(page - 1) * per_page:page * per_page]
+        headers = self._rate_headers()
+        if page * per_page < len(issues):
+            base = self._url(f"/repos/{owner}/{repo}/issues")
+            headers['Link'] = f'<{base}?state={state}&per_page={per_page}&page={page + 1}>; rel="next"'
+        self._send(200, [self._issue_json(owner, repo, issue) for issue in page_items], headers)
+
+    def do_POST(self):
+        time.sleep(self.server.config['latency'])
+        self.server.count('requests')
+        parsed, parts = self._route()
+        body = self._body()
+
+        if len(parts) == 4 and parts[3] == 'issues':
+            with self.server.lock:
+                number = len(self.server.issues) + 1
+                issue = {'number': number, 'id': number, 'title': body.get('title', ''), 'body': body.get('body', ''),
+                         'state': 'open', 'labels': list(body.get('labels', [])), 'comments': 0,
+                         'created_at': _now(), 'updated_at': _now()}
+                self.server.issues[number] = issue
+            self._send(201, self._issue_json(parts[1], parts[2], issue), self._rate_headers())
+            return
+        if len(parts) == 6 and parts[3] == 'issues' and parts[5] == 'comments':
+            with self.server.lock:
+                issue = self.server.issues[int(parts[4])]
+                issue['comments'] += 1
+                issue['updated_at'] = _now()
+                self.server.stats['comments'] += 1
+            self._send(201, {'id': issue['comments'], 'body': body.get('body', ''), 'user': {'login': 'bench'},
+                             'url': self._url(self.path)}, self._rate_headers())
+            return
+        self._send(404, {'message': 'Not Found'})
+
+    def do_PATCH(self):
+        time.sleep(self.server.config['latency'])
+        self.server.count('requests')
+        parsed, parts = self._route()
+        body = self._body()
+        if len(parts) == 5 and parts[3] == 'issues':
+            with self.server.lock:
+                issue = self.server.issues[int(parts[4])]
+                if 'state' in body:
+                    issue['state'] = body['state']
+                if 'labels' in body:
+                    issue['labels'] = list(body['labels'])
+                issue['updated_at'] = _now()
+            self._send(200, self._issue_json(parts[1], parts[2], issue), self._rate_headers())
+            return
+        self._send(404, {'message': 'Not Found'})
+
+class FakeServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, handler, config):
+        super().__init__(('127.0.0.1', 0), handler)
+        self.config = config
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'errors': 0, 'comments': 0, 'remaining': 5000}
+        self.issues = {}
+        self.files = {}
+        self.batches = {}
+
+    def count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    @property
+    def url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+def start_servers(openai_latency=0.3, token_rate=400.0, error_rate=0.0, github_latency=0.05, seed=7):
+    """Start both stand-ins on free local ports in background threads. Returns (openai, github) servers."""
+    openai_server = FakeServer(FakeOpenAIHandler, {
+        'latency': openai_latency, 'token_rate': token_rate, 'error_rate': error_rate, 'rng': random.Random(seed)})
+    github_server = FakeServer(FakeGitHubHandler, {'latency': github_latency})
+    for server in (openai_server, github_server):
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    return openai_server, github_server
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--latency', type=float, default=0.3, help='seconds before the first token')
+    parser.add_argument('--token-rate', type=float, default=400.0, help='completion tokens per second')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of requests answered with 429/500')
+    parser.add_argument('--github-latency', type=float, default=0.05)
+    args = parser.parse_args()
+
+    openai_server, github_server = start_servers(args.latency, args.token_rate, args.error_rate, args.github_latency)
+    print(f"OPENAI_BASE_URL={openai_server.url}/v1")
+    print(f"GITHUB_API_URL={github_server.url}", flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+import hashlib
+import json
+import os
+
+from results_store import load_result
+
+def prompt_version(messages, temperature, routing=None):
+    """Short fingerprint of the prompt template; pass the messages built for an empty transcript.
+
+    routing describes tiered model routing when it is on (see routing.py).
+    """
+    settings = {'messages': messages, 'temperature': temperature}
+    if routing is not None:
+        settings['routing'] = routing
+    payload = json.dumps(settings, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:12]
+
+def previous_result(video_id):
+    """The finished result for a video, or None if there is none yet."""
+    try:
+        return load_result(video_id)
+    except (OSError, ValueError):
+        return None
+
+def needs_recheck(result, model, version):
+    """True if a finished result should be checked again rather than served as is.
+
+    That is the case when FACT_CHECK_RECHECK=1, or when it was checked with a
+    different model or prompt. Results written before check records existed
+    are kept unless a re-check is asked for.
+    """
+    if os.environ.get('FACT_CHECK_RECHECK') == '1':
+        return True
+    check = result.get('check')
+    return check is not None and (check.get('model') != model or check.get('prompt_version') != version)
+
+def reusable_chunks(result, model, version):
+    """Map chunk hash to {'start', 'claims'} for a result checked with the same model and prompt."""
+    check = (result or {}).get('check')
+    if not check or check.get('model') != model or check.get('prompt_version') != version:
+        return {}
+
+    claims = result.get('claims', [])
+    chunks = {}
+    for chunk in check.get('chunks', []):
+        chunks[chunk['hash']] = {
+            'start': chunk['start'],
+            'claims': [claims[index] for index in chunk['claims'] if index < len(claims)],
+        }
+    return chunks
+
+def check_record(model, version, chunk_log, offset=0, positions=None):
+    """The 'check' entry of a results file.
+
+    offset is the number of claims placed before the chunk claims, and
+    positions maps each claim's index to where it ended up after sorting.
+    """
+    def position(index):
+        index += offset
+        return positions[index] if positions is not None else index
+
+    return {
+        'model': model,
+        'prompt_version': version,
+        'chunks': [
+            {'hash': chunk['hash'], 'start': chunk['start'], 'claims': sorted(position(index) for index in chunk['claims'])}
+            for chunk in chunk_log
+        ],
+    }
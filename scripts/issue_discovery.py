@@ -0,0 +1,117 @@
+import json
+import os
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime, timedelta
+from email.utils import parsedate_to_datetime
+
+from metrics import count
+from rate_limit import API_URL, github_call
+
+TITLE_PREFIX = 'Fact-check:'
+DEFAULT_STATE_PATH = '.cache/queue_state.json'
+# Overlap between runs so issues updated while a run was starting are not missed
+WATERMARK_OVERLAP = timedelta(minutes=1)
+
+class IssueDiscovery:
+    """Finds queued fact-check issues with as few GitHub API calls as possible.
+
+    A one-item conditional request on the open-issue list, sorted by update
+    time, tells us whether anything changed since the last run. 304 replies
+    do not count against the rate limit. Only when something changed do we
+    list the issues, filtered on the server by label and a "since" watermark,
+    or by a title search when QUEUE_SEARCH=1.
+    """
+
+    def __init__(self, github, repo, github_token, state_path=DEFAULT_STATE_PATH):
+        self.github = github
+        self.repo = repo
+        self.github_token = github_token
+        self.state_path = state_path
+        self.label = os.environ.get('QUEUE_LABEL') or None
+        self.use_search = os.environ.get('QUEUE_SEARCH') == '1'
+        self.state = {}
+        self.pending_state = None
+
+        if os.path.exists(state_path):
+            with open(state_path) as f:
+                self.state = json.load(f)
+        # A different filter invalidates the stored ETag and watermark
+        if self.state.get('filters') != self._filters_key():
+            self.state = {}
+
+    def _filters_key(self):
+        return f"{self.repo.full_name}|{self.label or ''}|{'search' if self.use_search else 'list'}"
+
+    def _probe(self):
+        params = {'state': 'open', 'sort': 'updated', 'direction': 'desc', 'per_page': 1}
+        if self.label:
+            params['labels'] = self.label
+        headers = {
+            'Authorization': f"Bearer {self.github_token}",
+            'Accept': 'application/vnd.github+json',
+        }
+        if self.state.get('etag'):
+            headers['If-None-Match'] = self.state['etag']
+
+        url = f"{API_URL}/repos/{self.repo.full_name}/issues?{urllib.parse.urlencode(params)}"
+        request = urllib.request.Request(url, headers=headers)
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                etag = response.headers.get('ETag')
+                server_time = parsedate_to_datetime(response.headers['Date']) if response.headers.get('Date') else None
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                return False
+            raise
+
+        since = (server_time - WATERMARK_OVERLAP).isoformat() if server_time else None
+        self.pending_state = {'filters': self._filters_key(), 'etag': etag, 'since': since}
+        return True
+
+    def discover(self):
+        """Return the open fact-check issues that may need processing."""
+        if not github_call(self._probe):
+            print("No issue changes since the last run")
+            return []
+
+        if self.use_search:
+            query = f'repo:{self.repo.full_name} is:issue is:open in:title "{TITLE_PREFIX}"'
+            issues = github_call(lambda: list(self.github.search_issues(query)))
+        else:
+            filters = {'state': 'open', 'sort': 'updated', 'direction': 'desc'}
+            if self.label:
+                filters['labels'] = [self.label]
+            if self.state.get('since'):
+                filters['since'] = datetime.fromisoformat(self.state['since'])
+            issues = github_call(lambda: list(self.repo.get_issues(**filters)))
+
+        return [issue for issue in issues if issue.title.startswith(TITLE_PREFIX)]
+
+    def save(self):
+        """Advance the ETag and watermark. Only call once every discovered issue is resolved."""
+        if self.pending_state is None:
+            return
+        if os.path.dirname(self.state_path):
+            os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        with open(self.state_path, 'w') as f:
+            json.dump(self.pending_state, f)
+
+def core_quota_remaining(github):
+    """Core requests left, from /rate_limit (which costs none).
+
+    github.rate_limiting only reflects the last PyGithub response, which may be
+    a search, and misses the conditional probe made with urllib.
+    """
+    return github_call(github.get_rate_limit).resources.core.remaining
+
+def log_api_usage(github, remaining_at_start):
+    """Print the core requests this run used and how many are left."""
+    core = github_call(github.get_rate_limit).resources.core
+    used = remaining_at_start - core.remaining
+    if used < 0:
+        # The hourly window reset during the run; count what was used since
+        used = core.limit - core.remaining
+    count('github_core_requests', used)
+    print(f"GitHub API: {used} core requests used this run, {core.remaining}/{core.limit} remaining")
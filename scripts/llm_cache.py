@@ -0,0 +1,124 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+from metrics import count
+from rate_limit import openai_call, estimate_tokens
+
+DEFAULT_CACHE_PATH = '.cache/llm_responses.sqlite'
+DEFAULT_CACHE_MAX_BYTES = 50 * 1024 * 1024
+
+class ResponseCache:
+    """Size-capped LRU store of chat completion responses keyed by request content."""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self._db.commit()
+
+    @staticmethod
+    def make_key(model, messages, temperature):
+        """Hash everything that determines the model's answer."""
+        payload = json.dumps({'model': model, 'messages': messages, 'temperature': temperature}, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            row = self._db.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                count('llm_cache_misses')
+                return None
+            self._db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+            self.hits += 1
+            count('llm_cache_hits')
+            return zlib.decompress(row[0]).decode('utf-8')
+
+    def put(self, key, value):
+        blob = zlib.compress(value.encode('utf-8'))
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, blob, len(blob), time.time())
+            )
+            self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._db.execute("SELECT key, size FROM responses ORDER BY last_used").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            self.evictions += 1
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    """Shared cache configured from the environment, or None when disabled."""
+    global _cache
+    if os.environ.get('FACT_CHECK_CACHE', '1') == '0':
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache(
+                os.environ.get('FACT_CHECK_CACHE_PATH', DEFAULT_CACHE_PATH),
+                int(os.environ.get('FACT_CHECK_CACHE_MAX_BYTES', DEFAULT_CACHE_MAX_BYTES))
+            )
+        return _cache
+
+def cached_completion(client, model, messages, temperature):
+    """Return the assistant message for a chat completion, reading through the response cache."""
+    cache = get_cache()
+    key = None
+    if cache is not None:
+        key = cache.make_key(model, messages, temperature)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+    response = openai_call(client.chat.completions.create, model=model, messages=messages, temperature=temperature,
+                           tokens=estimate_tokens(messages))
+    result = response.choices[0].message.content
+    record_usage(response.usage)
+
+    if cache is not None and result is not None:
+        cache.put(key, result)
+    return result
+
+def record_usage(usage):
+    """Count the prompt and completion tokens an API response reports."""
+    if usage is not None:
+        count('openai_prompt_tokens', usage.prompt_tokens or 0)
+        count('openai_completion_tokens', usage.completion_tokens or 0)
+
+def print_cache_stats():
+    cache = get_cache()
+    if cache is not None:
+        stats = cache.stats()
+        print(f"LLM cache: {stats['hits']} hits, {stats['misses']} misses, {stats['evictions']} evictions")
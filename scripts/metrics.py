@@ -0,0 +1,177 @@
+"""Per-stage timings and counters for one pipeline run.
+
+Stages are timed with `with stage('name'):` and counters bumped with
+count('name', amount). At the end of a run write_metrics() saves a JSON
+file per run under FACT_CHECK_METRICS_DIR (default .cache/metrics) and,
+when FACT_CHECK_PROMETHEUS_PATH is set, a Prometheus text-format file for
+the node_exporter textfile collector. FACT_CHECK_METRICS=0 disables both.
+
+Usage: python scripts/metrics.py [metrics_dir]   # p50/p95 per stage across saved runs
+"""
+import glob
+import json
+import math
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+DEFAULT_METRICS_DIR = '.cache/metrics'
+# Run files kept for summaries; older ones are deleted
+DEFAULT_KEEP_RUNS = 500
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+class Metrics:
+    """Thread-safe wall-time samples per stage and named counters."""
+
+    def __init__(self):
+        self.started = time.time()
+        self.timings = defaultdict(list)
+        self.counters = defaultdict(int)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started)
+
+    def observe(self, name, seconds):
+        with self._lock:
+            self.timings[name].append(seconds)
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def snapshot(self):
+        with self._lock:
+            stages = {}
+            for name, samples in self.timings.items():
+                stages[name] = {
+                    'count': len(samples),
+                    'total': round(sum(samples), 4),
+                    'p50': round(percentile(samples, 0.5), 4),
+                    'p95': round(percentile(samples, 0.95), 4),
+                    'max': round(max(samples), 4),
+                    'samples': [round(sample, 4) for sample in samples],
+                }
+            counters = {name: round(value, 4) if isinstance(value, float) else value
+                        for name, value in self.counters.items()}
+        return {
+            'started_at': self.started,
+            'seconds': round(time.time() - self.started, 3),
+            'stages': stages,
+            'counters': counters,
+        }
+
+_metrics = Metrics()
+# Daemon workers write the Prometheus file after every job
+_prometheus_lock = threading.Lock()
+
+def get_metrics():
+    return _metrics
+
+def stage(name):
+    """Context manager timing one pass through a pipeline stage."""
+    return _metrics.stage(name)
+
+def count(name, amount=1):
+    _metrics.count(name, amount)
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def prometheus_text(run_name, snapshot):
+    lines = [
+        '# HELP fact_check_stage_seconds Wall time of fact-check pipeline stages in the last run.',
+        '# TYPE fact_check_stage_seconds summary',
+    ]
+    for name, summary in sorted(snapshot['stages'].items()):
+        labels = f'run="{_label(run_name)}",stage="{_label(name)}"'
+        lines.append(f'fact_check_stage_seconds{{{labels},quantile="0.5"}} {summary["p50"]}')
+        lines.append(f'fact_check_stage_seconds{{{labels},quantile="0.95"}} {summary["p95"]}')
+        lines.append(f'fact_check_stage_seconds_sum{{{labels}}} {summary["total"]}')
+        lines.append(f'fact_check_stage_seconds_count{{{labels}}} {summary["count"]}')
+    lines += [
+        '# HELP fact_check_counter Counters (tokens, bytes, API calls and retries) from the last run.',
+        '# TYPE fact_check_counter gauge',
+    ]
+    for name, value in sorted(snapshot['counters'].items()):
+        lines.append(f'fact_check_counter{{run="{_label(run_name)}",counter="{_label(name)}"}} {value}')
+    lines.append(f'fact_check_run_seconds{{run="{_label(run_name)}"}} {snapshot["seconds"]}')
+    return '\n'.join(lines) + '\n'
+
+def write_prometheus(run_name, path=None):
+    path = path or os.environ.get('FACT_CHECK_PROMETHEUS_PATH')
+    if not path or os.environ.get('FACT_CHECK_METRICS', '1') == '0':
+        return
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    # The textfile collector may read at any time, so replace the file atomically.
+    # Writers are serialised so an older snapshot never replaces a newer one
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with _prometheus_lock:
+        with open(tmp_path, 'w') as f:
+            f.write(prometheus_text(run_name, _metrics.snapshot()))
+        os.replace(tmp_path, path)
+
+def write_metrics(run_name):
+    """Save this run's metrics and print one line of stage totals. Returns the JSON path or None."""
+    if os.environ.get('FACT_CHECK_METRICS', '1') == '0':
+        return None
+
+    snapshot = _metrics.snapshot()
+    snapshot['run'] = run_name
+    if snapshot['stages']:
+        print("Stage timings: " + ', '.join(
+            f"{name} {summary['total']:.1f}s/{summary['count']}" for name, summary in sorted(snapshot['stages'].items())))
+
+    metrics_dir = os.environ.get('FACT_CHECK_METRICS_DIR', DEFAULT_METRICS_DIR)
+    os.makedirs(metrics_dir, exist_ok=True)
+    stamp = time.strftime('%Y%m%dT%H%M%S', time.gmtime(snapshot['started_at']))
+    path = os.path.join(metrics_dir, f"{run_name}-{stamp}-{os.getpid()}.json")
+    with open(path, 'w') as f:
+        json.dump(snapshot, f)
+    _prune(metrics_dir, int(os.environ.get('FACT_CHECK_METRICS_KEEP', DEFAULT_KEEP_RUNS)))
+
+    write_prometheus(run_name)
+    return path
+
+def _prune(metrics_dir, keep):
+    paths = sorted(glob.glob(os.path.join(metrics_dir, '*.json')), key=os.path.getmtime)
+    for path in paths[:max(0, len(paths) - keep)]:
+        os.remove(path)
+
+def summarize(metrics_dir):
+    """Pool the stage samples of every saved run and print p50/p95 per stage."""
+    samples = defaultdict(list)
+    runs = 0
+    for path in sorted(glob.glob(os.path.join(metrics_dir, '*.json'))):
+        try:
+            with open(path) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Skipping unreadable metrics file {path}: {e}")
+            continue
+        runs += 1
+        for name, summary in snapshot.get('stages', {}).items():
+            samples[name].extend(summary.get('samples', []))
+
+    print(f"{runs} runs in {metrics_dir}")
+    print(f"{'stage':<32}{'count':>8}{'p50 s':>10}{'p95 s':>10}{'max s':>10}")
+    for name, values in sorted(samples.items()):
+        print(f"{name:<32}{len(values):>8}{percentile(values, 0.5):>10.3f}{percentile(values, 0.95):>10.3f}{max(values):>10.3f}")
+
+if __name__ == '__main__':
+    summarize(sys.argv[1] if len(sys.argv) > 1 else os.environ.get('FACT_CHECK_METRICS_DIR', DEFAULT_METRICS_DIR))
@@ -0,0 +1,183 @@
+"""The fact-check pipeline shared by process_single_issue.py, process_queue.py and batch_check.py.
+
+check_video takes one video from transcript to a staged result: caption
+compaction, claim reuse, the optional prefilter, chunked model calls
+(streamed or tiered when enabled), timestamp alignment and the sorted
+result with its check record. The entry points differ only in where the
+transcript comes from and how the outcome is reported.
+"""
+import os
+import json
+from chunking import fact_check_chunked
+from alignment import ClaimAligner
+from transcript import format_transcript
+from compaction import compact_for_prompt
+from worthiness import prefilter_for_prompt
+from claim_index import split_known_claims, record_result
+from llm_cache import cached_completion
+from streaming import stream_completion, PartialResultWriter
+from results_store import save_result
+from incremental import prompt_version, previous_result, needs_recheck, reusable_chunks, check_record
+from metrics import stage, count
+from timeline import sort_claims, build_timeline
+from routing import ClaimRouter, fast_system_prompt, routing_fingerprint, tiered_enabled
+
+MODEL = os.environ.get('FACT_CHECK_MODEL', "gpt-4o-mini")
+TEMPERATURE = float(os.environ.get('FACT_CHECK_TEMPERATURE', 0.3))
+SYSTEM_PROMPT = "You are a fact-checker. Analyze the provided transcript and identify claims that need fact-checking. For each claim, provide: the claim text, whether it's accurate/inaccurate/misleading/unverifiable, a brief explanation, and surrounding context from the transcript. Return as JSON array with format: [{\"claim\": \"text\", \"verdict\": \"accurate/inaccurate/misleading/unverifiable\", \"explanation\": \"brief explanation\", \"context\": \"surrounding context\"}]"
+
+def build_messages(text):
+    """Chat messages asking the model to fact-check one transcript chunk."""
+    return [
+        {"role": "system", "content": fast_system_prompt(SYSTEM_PROMPT)},
+        {"role": "user", "content": f"Fact-check this video transcript:\n\n{text}"}
+    ]
+
+# Stored with each result; a change to the prompt invalidates every chunk checked with the old one
+PROMPT_VERSION = prompt_version(build_messages(''), TEMPERATURE, routing_fingerprint())
+
+def parse_claims(result):
+    """Parse the model's JSON array, wrapping anything else as a single info entry."""
+    try:
+        claims = json.loads(result)
+        return claims
+    except:
+        return [{"claim": "Analysis completed", "verdict": "info", "explanation": result}]
+
+def fact_check_content(text, client, on_claim=None):
+    """Use OpenAI to fact-check the content. If on_claim is given, claims are streamed to it as they arrive."""
+    try:
+        messages = build_messages(text)
+        # In tiered mode doubtful fast-pass verdicts are verified on the strong model before they are used
+        router = ClaimRouter(client, TEMPERATURE, on_claim) if tiered_enabled() else None
+
+        with stage('fact_check_content'):
+            if on_claim is not None:
+                result = stream_completion(client, MODEL, messages, TEMPERATURE, router.add if router else on_claim)
+            else:
+                # Identical requests are answered from the local response cache
+                result = cached_completion(client, model=MODEL, messages=messages, temperature=TEMPERATURE)
+
+        claims = parse_claims(result)
+        if router is None:
+            return claims
+        if on_claim is None:
+            for claim in claims if isinstance(claims, list) else [claims]:
+                router.add(claim)
+        return router.finish()
+
+    except Exception as e:
+        print(f"Error fact-checking: {e}")
+        raise
+
+def match_claims_to_timestamps(claims, transcript_data, aligner=None):
+    """Match fact-checked claims back to transcript timestamps."""
+    with stage('match_claims_to_timestamps'):
+        if aligner is None:
+            aligner = ClaimAligner(transcript_data)
+        results = []
+
+        for claim in claims:
+            if claim.get('carried'):
+                # Carried over from an unchanged chunk of an earlier check, already aligned
+                results.append({key: value for key, value in claim.items() if key != 'carried'})
+                continue
+
+            # Unmatched claims fall back to the start of the video
+            match = aligner.align(claim.get('claim', ''), claim.get('context', ''))
+
+            results.append({
+                'timestamp': match['start'] if match else 0,
+                'end': match['end'] if match else 0,
+                'confidence': match['confidence'] if match else 0.0,
+                'claim': claim.get('claim', ''),
+                'verdict': claim.get('verdict', 'unverified'),
+                'explanation': claim.get('explanation', '')
+            })
+            if claim.get('reused_from'):
+                results[-1]['reused_from'] = claim['reused_from']
+            if claim.get('tier'):
+                results[-1]['tier'] = claim['tier']
+
+        return results
+
+def check_video(video_id, openai_client, transcript=None, fetch_transcript=None):
+    """Fact-check one video and stage its result. Returns {'success', 'message'}; raises on failure.
+
+    A transcript in hand is diffed against a previous result's chunk hashes.
+    Otherwise fetch_transcript(video_id) is called only when the previous
+    result is out of date, since fetching costs more than the check it saves.
+    """
+    print(f"Processing video: {video_id}")
+
+    # Check if already processed (a partial file is left by an interrupted streaming run)
+    output_path = f"results/{video_id}.json"
+    previous = previous_result(video_id)
+    # Chunks unchanged since the previous check are not sent again
+    carried = reusable_chunks(previous, MODEL, PROMPT_VERSION)
+    if previous is not None and not needs_recheck(previous, MODEL, PROMPT_VERSION) and (transcript is None or not carried):
+        print(f"Video {video_id} already processed, skipping")
+        return {'success': True, 'message': 'Already processed'}
+
+    if transcript is None:
+        with stage('get_transcript'):
+            transcript = fetch_transcript(video_id)
+        if not transcript:
+            raise Exception("Failed to get transcript. This video may have subtitles disabled or be unavailable.")
+    elif not transcript:
+        raise Exception("No transcript provided")
+
+    # Collapse rolling auto-caption repeats before they reach the prompt
+    transcript = compact_for_prompt(transcript)
+    if not transcript:
+        raise Exception("No speech in transcript. It only has tags such as [Music] or [Applause].")
+
+    # Format transcript
+    full_text, transcript_data = format_transcript(transcript)
+    print(f"Transcript length: {len(full_text)} characters")
+
+    # Reuse verdicts for claims already checked in other videos
+    reused_claims, unchecked_data = split_known_claims(transcript_data, exclude_video=video_id)
+
+    # Only sentences that look like factual claims (plus context) go to the model
+    unchecked_data = prefilter_for_prompt(unchecked_data)
+
+    os.makedirs("results", exist_ok=True)
+    aligner = ClaimAligner(transcript_data)
+    on_claim = None
+    if os.environ.get('FACT_CHECK_STREAM') == '1' and previous is None:
+        # Write each claim to a local partial results file as soon as the model produces it.
+        # A re-check leaves the earlier result in place until the new one is complete
+        writer = PartialResultWriter(video_id, output_path, transcript_data, match_claims_to_timestamps, aligner, reused_claims)
+        on_claim = writer.add
+
+    # Fact check the whole transcript in overlapping chunks - let exceptions bubble up
+    chunk_log = []
+    claims = reused_claims + fact_check_chunked(unchecked_data, openai_client, fact_check_content, on_claim=on_claim,
+                                                previous=carried, chunk_log=chunk_log)
+    print(f"Found {len(claims)} claims to check")
+
+    # Match to timestamps
+    results = match_claims_to_timestamps(claims, transcript_data, aligner=aligner)
+    # The player looks claims up by time, so they are stored in time order with a bucket index
+    results, positions = sort_claims(results)
+
+    checked = sum(1 for chunk in chunk_log if chunk['hash'] not in carried)
+    if previous is not None and not checked and results == previous.get('claims'):
+        print(f"Video {video_id} is unchanged since it was last checked")
+        return {'success': True, 'message': 'Already processed'}
+
+    # Stage results for the sharded store, replacing any partial file. The check record lets a later run skip unchanged chunks
+    saved_path = save_result(video_id, {
+        'video_id': video_id,
+        'claims': results,
+        'timeline': build_timeline(results),
+        'check': check_record(MODEL, PROMPT_VERSION, chunk_log, offset=len(reused_claims), positions=positions)
+    })
+
+    print(f"Results saved to {saved_path}")
+    count('claims_found', len(results))
+    record_result(video_id, results)
+    if carried:
+        return {'success': True, 'message': f"Re-checked {checked} of {len(chunk_log)} transcript chunks, the rest were unchanged"}
+    return {'success': True, 'message': 'Fact-check completed successfully'}
@@ -2,21 +2,78 @@ import os
 import json
 import sys
 import re
-from github import Github, Auth
-from openai import OpenAI
+import gzip
+import base64
+from llm_cache import print_cache_stats
+from rate_limit import github_call, create_github_client, create_openai_client, print_rate_limit_stats
+from metrics import stage, count, write_metrics
+from single_flight import run_once
+from pipeline import check_video
+
+# Transcript encoding written by js/github-api.js; "fctx1z" marks the gzipped variant
+WIRE_FORMAT = "fctx1"
+
+def _find_code_block(issue_body, language):
+    """Return the contents of the first ```language fenced block, or None."""
+    opening = f"```{language}\n"
+    start = issue_body.find(opening)
+    if start == -1:
+        return None
+    start += len(opening)
+    end = issue_body.find("\n```", start)
+    if end == -1:
+        return None
+    return issue_body[start:end]
+
+def _unescape_line(line):
+    if '\\' not in line:
+        return line
+    return re.sub(r'\\(.)', lambda m: '\n' if m.group(1) == 'n' else m.group(1), line)
+
+def decode_compact_transcript(payload, compressed=False):
+    """Decode the fctx1 wire format written by js/github-api.js.
+
+    Layout: entry count, then comma-separated base-36 millisecond deltas
+    between start times, then one escaped text line per entry. The fctx1z
+    variant is the same payload gzipped and base64-encoded.
+    """
+    if compressed:
+        payload = gzip.decompress(base64.b64decode(''.join(payload.split()))).decode('utf-8')
+
+    lines = payload.split('\n')
+    count = int(lines[0])
+    deltas = lines[1].split(',') if count else []
+    texts = lines[2:2 + count]
+    if len(deltas) != count or len(texts) != count:
+        raise ValueError(f"Expected {count} entries, got {len(deltas)} timestamps and {len(texts)} lines")
+
+    transcript = []
+    start_ms = 0
+    for delta, text in zip(deltas, texts):
+        start_ms += int(delta, 36)
+        transcript.append({'start': start_ms / 1000.0, 'text': _unescape_line(text)})
+    return transcript
 
 def extract_transcript_from_issue(issue_body):
-    """Extract transcript JSON from issue body."""
+    """Extract the transcript from the issue body (compact fctx1 block or legacy JSON block)."""
     try:
-        # Look for JSON code block in the issue body
-        json_match = re.search(r'```json\n(.*?)\n```', issue_body, re.DOTALL)
-        
-        if not json_match:
-            print("No JSON transcript found in issue body")
-            return None
+        # GitHub may store the body with Windows line endings
+        issue_body = issue_body.replace('\r\n', '\n')
         
-        transcript_json = json_match.group(1)
-        transcript = json.loads(transcript_json)
+        compressed = _find_code_block(issue_body, WIRE_FORMAT + 'z')
+        if compressed is not None:
+            transcript = decode_compact_transcript(compressed, compressed=True)
+        else:
+            compact = _find_code_block(issue_body, WIRE_FORMAT)
+            if compact is not None:
+                transcript = decode_compact_transcript(compact)
+            else:
+                # Issues created before the compact format carry pretty-printed JSON
+                transcript_json = _find_code_block(issue_body, 'json')
+                if transcript_json is None:
+                    print("No transcript found in issue body")
+                    return None
+                transcript = json.loads(transcript_json)
         
         print(f"Extracted transcript with {len(transcript)} entries from issue")
         return transcript
@@ -25,165 +82,126 @@ def extract_transcript_from_issue(issue_body):
         print(f"Error extracting transcript from issue: {e}")
         return None
 
-def format_transcript(transcript):
-    """Convert transcript to readable text with timestamps."""
-    if not transcript:
-        return None, None
-    
-    formatted = []
-    for entry in transcript:
-        formatted.append({
-            'start': entry['start'],
-            'text': entry['text']
-        })
-    
-    full_text = ' '.join([entry['text'] for entry in transcript])
-    return full_text, formatted
+def process_video(video_id, transcript, openai_client):
+    """Process a single video fact-check using provided transcript.
+
+    Concurrent requests for the same video share one run (see single_flight.py).
+    """
+    result = run_once(video_id, check_video, video_id, openai_client, transcript=transcript)
+    print_cache_stats()
+    print_rate_limit_stats()
+    return result
+
+def video_id_from_title(title):
+    # Expected format: "Fact-check: VIDEO_ID"; the workflow's concurrency group reads it the same way
+    return title.replace('Fact-check:', '').strip()
 
-def fact_check_content(text, client):
-    """Use OpenAI to fact-check the content."""
+def close_duplicate_issues(github, issue, repo, video_id, comment, label='completed'):
+    """Close other open requests for the same video with the outcome of this one.
+
+    Parallel workflow runs for one video are serialised by the workflow's
+    concurrency group, but GitHub keeps only one pending run per group, so
+    later duplicates may never run on their own. That holds when this run
+    fails too, so they are closed either way.
+    """
+    query = f'repo:{repo.full_name} is:issue is:open in:title "{video_id}"'
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a fact-checker. Analyze the provided transcript and identify claims that need fact-checking. For each claim, provide: the claim text, whether it's accurate/inaccurate/misleading/unverifiable, a brief explanation, and surrounding context from the transcript. Return as JSON array with format: [{\"claim\": \"text\", \"verdict\": \"accurate/inaccurate/misleading/unverifiable\", \"explanation\": \"brief explanation\", \"context\": \"surrounding context\"}]"},
-                {"role": "user", "content": f"Fact-check this video transcript:\n\n{text[:15000]}"}
-            ],
-            temperature=0.3
-        )
-        
-        result = response.choices[0].message.content
-        try:
-            claims = json.loads(result)
-            return claims
-        except:
-            return [{"claim": "Analysis completed", "verdict": "info", "explanation": result}]
-            
+        # Searching by title, with every page fetched inside the scheduler, instead of listing all open issues
+        duplicates = github_call(lambda: list(github.search_issues(query)))
+        for other in duplicates:
+            # Search matches words, so "Fact-check:X" and "Fact-check: X" are both found and filtered here
+            if other.number == issue.number or video_id_from_title(other.title) != video_id:
+                continue
+            print(f"Closing duplicate issue #{other.number} for video {video_id}")
+            github_call(other.create_comment, f"{comment}\n\n(Checked once for this video in #{issue.number}.)")
+            github_call(other.edit, state='closed', labels=[label])
     except Exception as e:
-        print(f"Error fact-checking: {e}")
-        raise
-
-def match_claims_to_timestamps(claims, transcript_data):
-    """Match fact-checked claims back to transcript timestamps."""
-    results = []
-    
-    for claim in claims:
-        claim_text = claim.get('claim', '').lower()
-        context_text = claim.get('context', '').lower()
-        
-        best_match_time = 0
-        
-        for entry in transcript_data:
-            entry_text = entry['text'].lower()
-            
-            if claim_text and any(word in entry_text for word in claim_text.split() if len(word) > 4):
-                best_match_time = entry['start']
-                break
-            elif context_text and context_text[:50] in entry_text:
-                best_match_time = entry['start']
-                break
-        
-        results.append({
-            'timestamp': best_match_time,
-            'claim': claim.get('claim', ''),
-            'verdict': claim.get('verdict', 'unverified'),
-            'explanation': claim.get('explanation', '')
-        })
-    
-    return results
+        # A duplicate left open still gets answered if its own run starts
+        print(f"Could not close duplicate issues for video {video_id}: {e}")
 
-def process_video(video_id, transcript, openai_client):
-    """Process a single video fact-check using provided transcript."""
-    print(f"Processing video: {video_id}")
-    
-    # Check if already processed
-    output_path = f"results/{video_id}.json"
-    if os.path.exists(output_path):
-        print(f"Video {video_id} already processed, skipping")
-        return {'success': True, 'message': 'Already processed'}
-    
-    # Validate transcript
-    if not transcript:
-        raise Exception("No transcript provided")
-    
-    # Format transcript
-    full_text, transcript_data = format_transcript(transcript)
-    print(f"Transcript length: {len(full_text)} characters")
-    
-    # Fact check
-    claims = fact_check_content(full_text, openai_client)
-    print(f"Found {len(claims)} claims to check")
-    
-    # Match to timestamps
-    results = match_claims_to_timestamps(claims, transcript_data)
-    
-    # Save results
-    os.makedirs("results", exist_ok=True)
-    
-    with open(output_path, 'w') as f:
-        json.dump({
-            'video_id': video_id,
-            'claims': results
-        }, f, indent=2)
-    
-    print(f"Results saved to {output_path}")
-    return {'success': True, 'message': 'Fact-check completed successfully'}
+def process_issue(issue, repo, openai_client, github=None):
+    """Fact-check the video named by an issue and close it with the outcome. Returns True on success.
 
-def main():
-    github_token = os.environ.get('GITHUB_TOKEN')
-    openai_api_key = os.environ.get('OPENAI_API_KEY')
-    repo_name = os.environ.get('GITHUB_REPOSITORY')
-    issue_number = os.environ.get('ISSUE_NUMBER')
-    
-    if not all([github_token, openai_api_key, repo_name, issue_number]):
-        print("Missing required environment variables")
-        sys.exit(1)
-    
-    # Initialize clients
-    auth = Auth.Token(github_token)
-    g = Github(auth=auth)
-    repo = g.get_repo(repo_name)
-    openai_client = OpenAI(api_key=openai_api_key)
-    
-    # Get the specific issue
-    issue = repo.get_issue(int(issue_number))
+    With a github client, other open issues for the same video are closed too, whatever the outcome.
+    """
+    if issue.state == 'closed':
+        # Already answered, e.g. as a duplicate of a request for the same video
+        print(f"Issue #{issue.number} is already closed, skipping")
+        return True
     
     # Extract video ID from title
-    video_id = issue.title.replace('Fact-check:', '').strip()
+    video_id = video_id_from_title(issue.title)
     
     if not video_id:
-        issue.create_comment("❌ Invalid format. Title should be: `Fact-check: VIDEO_ID`")
-        issue.edit(state='closed', labels=['failed'])
-        sys.exit(1)
+        with stage('issue_update'):
+            github_call(issue.create_comment, "❌ Invalid format. Title should be: `Fact-check: VIDEO_ID`")
+            github_call(issue.edit, state='closed', labels=['failed'])
+        return False
     
     print(f"Processing issue #{issue.number} for video {video_id}")
     
     # Extract transcript from issue body
-    transcript = extract_transcript_from_issue(issue.body or '')
+    count('issue_body_bytes', len((issue.body or '').encode('utf-8')))
+    with stage('extract_transcript'):
+        transcript = extract_transcript_from_issue(issue.body or '')
     
     if not transcript:
         error_msg = "No transcript found in issue. Please use the web app to create issues with transcripts."
-        issue.create_comment(f"❌ {error_msg}")
-        issue.edit(state='closed', labels=['failed'])
-        sys.exit(1)
+        with stage('issue_update'):
+            github_call(issue.create_comment, f"❌ {error_msg}")
+            github_call(issue.edit, state='closed', labels=['failed'])
+        return False
     
     # Process the video
     try:
-        result = process_video(video_id, transcript, openai_client)
+        with stage('process_video'):
+            result = process_video(video_id, transcript, openai_client)
         
         # Close issue with success comment
-        issue.create_comment(f"✅ Fact-check complete! {result['message']}\n\nView results at: https://{repo.owner.login}.github.io/{repo.name}/?v={video_id}")
-        issue.edit(state='closed', labels=['completed'])
+        comment = f"✅ Fact-check complete! {result['message']}\n\nView results at: https://{repo.owner.login}.github.io/{repo.name}/?v={video_id}"
+        with stage('issue_update'):
+            github_call(issue.create_comment, comment)
+            github_call(issue.edit, state='closed', labels=['completed'])
+            if github is not None:
+                close_duplicate_issues(github, issue, repo, video_id, comment)
         
         print(f"✅ Successfully processed video {video_id}")
+        return True
         
     except Exception as e:
         # Comment with detailed error and close issue
         error_msg = str(e)
-        issue.create_comment(f"❌ Failed to process video.\n\n**Error:** {error_msg}\n\n**Possible solutions:**\n- Make sure the transcript was included in the issue\n- Try creating a new issue using the web app")
-        issue.edit(state='closed', labels=['failed'])
+        comment = f"❌ Failed to process video.\n\n**Error:** {error_msg}\n\n**Possible solutions:**\n- Make sure the transcript was included in the issue\n- Try creating a new issue using the web app"
+        with stage('issue_update'):
+            github_call(issue.create_comment, comment)
+            github_call(issue.edit, state='closed', labels=['failed'])
+            if github is not None:
+                close_duplicate_issues(github, issue, repo, video_id, comment, label='failed')
         
         print(f"❌ Failed to process video {video_id}: {error_msg}")
+        return False
+
+def main():
+    github_token = os.environ.get('GITHUB_TOKEN')
+    openai_api_key = os.environ.get('OPENAI_API_KEY')
+    repo_name = os.environ.get('GITHUB_REPOSITORY')
+    issue_number = os.environ.get('ISSUE_NUMBER')
+    
+    if not all([github_token, openai_api_key, repo_name, issue_number]):
+        print("Missing required environment variables")
+        sys.exit(1)
+    
+    # Initialize clients
+    g = create_github_client(github_token)
+    repo = github_call(g.get_repo, repo_name)
+    openai_client = create_openai_client(openai_api_key)
+    
+    # Get the specific issue
+    issue = github_call(repo.get_issue, int(issue_number))
+    
+    succeeded = process_issue(issue, repo, openai_client, g)
+    write_metrics('process_single_issue')
+    if not succeeded:
         sys.exit(1)
 
 if __name__ == "__main__":
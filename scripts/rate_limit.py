@@ -0,0 +1,222 @@
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+from metrics import count, stage
+
+# Actions and GitHub Enterprise set GITHUB_API_URL
+API_URL = os.environ.get('GITHUB_API_URL', 'https://api.github.com')
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BASE_DELAY = 1.0
+DEFAULT_MAX_DELAY = 60.0
+RETRYABLE_STATUS = frozenset([408, 409, 429, 500, 502, 503, 504])
+
+class TokenBucket:
+    """Thread-safe bucket refilled continuously at a per-minute rate."""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.available = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount=1):
+        """Block until amount is available. Returns the seconds spent waiting."""
+        amount = min(float(amount), self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.available >= amount:
+                    self.available -= amount
+                    return waited
+                shortfall = (amount - self.available) / self.rate
+            time.sleep(shortfall)
+            waited += shortfall
+
+def _status(error):
+    # OpenAI errors carry status_code, PyGithub errors carry status
+    status = getattr(error, 'status_code', None)
+    if status is None:
+        status = getattr(error, 'status', None)
+    return status if isinstance(status, int) else None
+
+def _headers(error):
+    headers = getattr(error, 'headers', None)
+    if headers is None and getattr(error, 'response', None) is not None:
+        headers = getattr(error.response, 'headers', None)
+    return {key.lower(): value for key, value in (headers or {}).items()}
+
+def is_retryable(error):
+    """Rate limits, server errors and dropped connections are worth retrying."""
+    status = _status(error)
+    if status in RETRYABLE_STATUS:
+        return True
+    if status == 403:
+        # GitHub reports secondary rate limits as 403s
+        return 'rate limit' in str(error).lower() or 'retry-after' in _headers(error)
+    if status is None:
+        name = type(error).__name__
+        return isinstance(error, (ConnectionError, TimeoutError)) or 'Connection' in name or 'Timeout' in name
+    return False
+
+def _parse_duration(value):
+    # OpenAI reset headers look like "1s", "6m0s" or "250ms"
+    total = 0.0
+    number = ''
+    index = 0
+    while index < len(value):
+        char = value[index]
+        if char.isdigit() or char == '.':
+            number += char
+        elif value.startswith('ms', index):
+            total += float(number or 0) / 1000
+            number = ''
+            index += 1
+        else:
+            total += float(number or 0) * {'h': 3600, 'm': 60, 's': 1}.get(char, 0)
+            number = ''
+        index += 1
+    return total
+
+def delay_from_headers(headers):
+    """Seconds the server asked us to wait, or None if it did not say."""
+    if 'retry-after-ms' in headers:
+        return float(headers['retry-after-ms']) / 1000
+    if 'retry-after' in headers:
+        value = headers['retry-after']
+        try:
+            return float(value)
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    if headers.get('x-ratelimit-remaining') == '0' and 'x-ratelimit-reset' in headers:
+        # GitHub: epoch seconds when the primary quota resets
+        return max(0.0, float(headers['x-ratelimit-reset']) - time.time())
+    for key in ('x-ratelimit-reset-requests', 'x-ratelimit-reset-tokens'):
+        if key in headers:
+            return _parse_duration(headers[key])
+    return None
+
+class Scheduler:
+    """Rate limiting and retry policy shared by every call to one API."""
+
+    def __init__(self, name, requests_per_minute, tokens_per_minute=None,
+                 max_retries=DEFAULT_MAX_RETRIES, base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY):
+        self.name = name
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.paused_until = 0.0
+        self.metrics = {'calls': 0, 'retries': 0, 'failures': 0, 'queue_wait_seconds': 0.0, 'max_queue_wait_seconds': 0.0}
+        self._lock = threading.Lock()
+
+    def _record(self, key, amount=1):
+        with self._lock:
+            self.metrics[key] += amount
+        count(f"{self.name.lower()}_{key}", amount)
+
+    def _wait_for_slot(self, tokens):
+        waited = 0.0
+        # A server-requested pause applies to every caller sharing this scheduler
+        pause = self.paused_until - time.monotonic()
+        if pause > 0:
+            time.sleep(pause)
+            waited += pause
+        waited += self.requests.acquire(1)
+        if self.tokens is not None and tokens:
+            waited += self.tokens.acquire(tokens)
+        with self._lock:
+            self.metrics['queue_wait_seconds'] += waited
+            self.metrics['max_queue_wait_seconds'] = max(self.metrics['max_queue_wait_seconds'], waited)
+        count(f"{self.name.lower()}_queue_wait_seconds", waited)
+
+    def call(self, fn, *args, tokens=0, **kwargs):
+        """Call fn within the rate limits, retrying transient failures with jittered backoff."""
+        attempt = 0
+        while True:
+            self._wait_for_slot(tokens)
+            self._record('calls')
+            try:
+                with stage(f"{self.name.lower()}_api"):
+                    return fn(*args, **kwargs)
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    self._record('failures')
+                    raise
+
+                backoff = min(self.max_delay, self.base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+                requested = delay_from_headers(_headers(e))
+                delay = min(self.max_delay, max(backoff, requested or 0.0))
+                if requested:
+                    with self._lock:
+                        self.paused_until = max(self.paused_until, time.monotonic() + delay)
+
+                attempt += 1
+                self._record('retries')
+                print(f"{self.name}: {type(e).__name__} ({_status(e) or 'no status'}), retry {attempt}/{self.max_retries} in {delay:.1f}s")
+                time.sleep(delay)
+
+    def stats(self):
+        with self._lock:
+            return dict(self.metrics)
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+def get_scheduler(name):
+    """Shared scheduler for 'openai' or 'github', with limits read from the environment."""
+    with _schedulers_lock:
+        if name not in _schedulers:
+            max_retries = int(os.environ.get('API_MAX_RETRIES', DEFAULT_MAX_RETRIES))
+            if name == 'openai':
+                _schedulers[name] = Scheduler(
+                    'OpenAI',
+                    int(os.environ.get('OPENAI_RPM', 500)),
+                    int(os.environ.get('OPENAI_TPM', 200000)),
+                    max_retries=max_retries
+                )
+            else:
+                # GitHub asks for well under 80 content-creating requests per minute
+                _schedulers[name] = Scheduler('GitHub', int(os.environ.get('GITHUB_RPM', 60)), max_retries=max_retries)
+        return _schedulers[name]
+
+def openai_call(fn, *args, tokens=0, **kwargs):
+    return get_scheduler('openai').call(fn, *args, tokens=tokens, **kwargs)
+
+def github_call(fn, *args, **kwargs):
+    return get_scheduler('github').call(fn, *args, **kwargs)
+
+def create_openai_client(api_key, **kwargs):
+    """An OpenAI client whose requests are meant to go through openai_call.
+
+    Clients are built with their own retries turned off. The shared scheduler
+    already retries with backoff and spreads a server's Retry-After across every
+    caller; retries inside the client would multiply the attempts and keep them
+    out of the scheduler's limits and counts. create_github_client does the same for GitHub.
+    """
+    from openai import OpenAI
+    return OpenAI(api_key=api_key, max_retries=0, **kwargs)
+
+def create_github_client(token, **kwargs):
+    """A PyGithub client for API_URL whose requests are meant to go through github_call."""
+    from github import Auth, Github
+    return Github(auth=Auth.Token(token), base_url=API_URL, retry=None, **kwargs)
+
+def estimate_tokens(messages, completion_tokens=1500):
+    """Rough prompt size (4 characters per token) plus room for the answer."""
+    return sum(len(message['content']) for message in messages) // 4 + completion_tokens
+
+def print_rate_limit_stats():
+    with _schedulers_lock:
+        schedulers = list(_schedulers.values())
+    for scheduler in schedulers:
+        stats = scheduler.stats()
+        print(f"{scheduler.name} API: {stats['calls']} calls, {stats['retries']} retries, {stats['failures']} failures, "
+              f"{stats['queue_wait_seconds']:.1f}s queued (max {stats['max_queue_wait_seconds']:.1f}s)")
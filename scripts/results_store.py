@@ -0,0 +1,213 @@
+"""Sharded store for fact-check results.
+
+Finished results live in a few compact shard files under results/shards/,
+one JSON document per line, plus results/manifest.json mapping each video
+ID to its shard and the byte offset and length of its line. The app
+fetches the manifest once and then the one shard it needs, instead of one
+file per video.
+
+Writers put results in results/pending/, which is not committed. `flush`
+folds them, and any per-video results/{id}.json files left by older
+versions, into the shards. A queue or daemon run followed by one flush
+therefore makes one commit however many videos it checked; the per-issue
+workflow still commits once per issue. Pending files are kept until
+`--clear`, so a flush can be repeated on top of a newer checkout after a
+rejected push.
+
+Usage:
+  python scripts/results_store.py flush [--clear]   # merge pending results into the shards
+  python scripts/results_store.py get VIDEO_ID      # print one stored result
+  python scripts/results_store.py stats
+
+RESULTS_SHARDS sets the shard count of a new store (default 16) and
+RESULTS_GZIP=1 gzips shards written from then on.
+"""
+import argparse
+import glob
+import gzip
+import hashlib
+import json
+import os
+import sys
+
+from streaming import is_partial_result
+
+RESULTS_DIR = 'results'
+DEFAULT_SHARDS = 16
+MANIFEST_VERSION = 1
+
+def _path(*parts):
+    return os.path.join(RESULTS_DIR, *parts)
+
+def _encode(data):
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+def _write_atomic(path, content):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+def shard_key(video_id, shard_count):
+    digest = hashlib.sha1(video_id.encode('utf-8')).hexdigest()
+    return f"{int(digest[:8], 16) % shard_count:02x}"
+
+def load_manifest():
+    try:
+        with open(_path('manifest.json')) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {
+            'version': MANIFEST_VERSION,
+            'shard_count': int(os.environ.get('RESULTS_SHARDS', DEFAULT_SHARDS)),
+            'shards': {},
+            'videos': {},
+        }
+
+def read_shard(manifest, key):
+    """Uncompressed bytes of a shard, or b'' if it does not exist yet."""
+    name = manifest['shards'].get(key)
+    if name is None:
+        return b''
+    with open(_path(name), 'rb') as f:
+        content = f.read()
+    return gzip.decompress(content) if name.endswith('.gz') else content
+
+def _shard_entries(manifest, key):
+    content = read_shard(manifest, key)
+    entries = {}
+    for video_id, (shard, offset, length) in manifest['videos'].items():
+        if shard == key:
+            entries[video_id] = content[offset:offset + length]
+    return entries
+
+def _pending_path(video_id):
+    return _path('pending', f"{video_id}.json")
+
+def _legacy_paths():
+    """Finished per-video files written before the store existed."""
+    for path in glob.glob(_path('*.json')):
+        if os.path.basename(path) != 'manifest.json' and not is_partial_result(path):
+            yield path
+
+def save_result(video_id, data):
+    """Stage a finished result for the next flush. Returns the file written."""
+    os.makedirs(_path('pending'), exist_ok=True)
+    path = _pending_path(video_id)
+    _write_atomic(path, _encode(data))
+
+    # The partial file a streaming run left behind is superseded
+    loose_path = _path(f"{video_id}.json")
+    if is_partial_result(loose_path):
+        os.remove(loose_path)
+    return path
+
+def _load_raw(video_id, manifest=None):
+    for path in (_pending_path(video_id), _path(f"{video_id}.json")):
+        if os.path.exists(path) and not is_partial_result(path):
+            with open(path, 'rb') as f:
+                return f.read()
+
+    manifest = manifest or load_manifest()
+    entry = manifest['videos'].get(video_id)
+    if entry is None:
+        return None
+    shard, offset, length = entry
+    return read_shard(manifest, shard)[offset:offset + length]
+
+def load_result(video_id):
+    """The finished result for a video, pending or published, or None."""
+    raw = _load_raw(video_id)
+    return json.loads(raw) if raw is not None else None
+
+def iter_results():
+    """Yield (video_id, raw JSON bytes) for every finished result, newest copy only."""
+    manifest = load_manifest()
+    staged = {}
+    for path in list(_legacy_paths()) + glob.glob(_path('pending', '*.json')):
+        staged[os.path.splitext(os.path.basename(path))[0]] = path
+
+    # Each shard is read and decompressed once for all of its videos
+    for key in sorted(set(shard for shard, _, _ in manifest['videos'].values())):
+        for video_id, raw in _shard_entries(manifest, key).items():
+            if video_id not in staged:
+                yield video_id, raw
+    for video_id, path in staged.items():
+        with open(path, 'rb') as f:
+            yield video_id, f.read()
+
+def flush(clear=False):
+    """Merge pending and legacy per-video results into the shards. Returns the number merged."""
+    updates = {}
+    sources = []
+    for path in list(_legacy_paths()) + sorted(glob.glob(_path('pending', '*.json'))):
+        with open(path, 'rb') as f:
+            # Re-encode, so legacy pretty-printed files are stored compactly too
+            updates[os.path.splitext(os.path.basename(path))[0]] = _encode(json.load(f))
+        sources.append(path)
+    if not updates:
+        return 0
+
+    manifest = load_manifest()
+    use_gzip = os.environ.get('RESULTS_GZIP') == '1'
+    os.makedirs(_path('shards'), exist_ok=True)
+
+    by_shard = {}
+    for video_id, raw in updates.items():
+        by_shard.setdefault(shard_key(video_id, manifest['shard_count']), {})[video_id] = raw
+
+    for key, changed in sorted(by_shard.items()):
+        entries = _shard_entries(manifest, key)
+        entries.update(changed)
+
+        content = bytearray()
+        for video_id in sorted(entries):
+            manifest['videos'][video_id] = [key, len(content), len(entries[video_id])]
+            content += entries[video_id] + b'\n'
+
+        # Names follow the content, so a fetched shard never changes under its URL
+        digest = hashlib.blake2b(bytes(content), digest_size=4).hexdigest()
+        name = f"shards/{key}-{digest}.jsonl"
+        if use_gzip:
+            name += '.gz'
+            content = gzip.compress(bytes(content), mtime=0)
+        _write_atomic(_path(name), bytes(content))
+
+        old_name = manifest['shards'].get(key)
+        manifest['shards'][key] = name
+        if old_name and old_name != name and os.path.exists(_path(old_name)):
+            os.remove(_path(old_name))
+
+    _write_atomic(_path('manifest.json'), json.dumps(manifest, separators=(',', ':'), sort_keys=True).encode('utf-8'))
+
+    for path in sources:
+        if clear or os.path.dirname(path) != _path('pending'):
+            os.remove(path)
+    print(f"Results store: merged {len(updates)} results into {len(by_shard)} shards")
+    return len(updates)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('command', choices=['flush', 'get', 'stats'])
+    parser.add_argument('video_id', nargs='?')
+    parser.add_argument('--clear', action='store_true', help='delete pending files once merged')
+    args = parser.parse_args()
+
+    if args.command == 'flush':
+        flush(args.clear)
+    elif args.command == 'get':
+        if not args.video_id:
+            parser.error("get needs a video ID")
+        result = load_result(args.video_id)
+        if result is None:
+            print(f"No result for {args.video_id}")
+            sys.exit(1)
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+    else:
+        manifest = load_manifest()
+        sizes = [os.path.getsize(_path(name)) for name in manifest['shards'].values()]
+        pending = len(glob.glob(_path('pending', '*.json')))
+        print(f"{len(manifest['videos'])} videos in {len(sizes)} shards, {sum(sizes)} bytes, {pending} pending")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+import json
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from llm_cache import cached_completion
+from metrics import stage, count
+
+DEFAULT_STRONG_MODEL = 'gpt-4o'
+# Fast-pass verdicts below this self-reported confidence are verified again
+DEFAULT_ESCALATE_CONFIDENCE = 0.7
+# Verdicts that are worth a second opinion whatever the confidence
+DEFAULT_ESCALATE_VERDICTS = 'inaccurate,misleading'
+DEFAULT_ESCALATE_CONCURRENCY = 4
+
+CONFIDENCE_PROMPT = " Also rate your confidence in each verdict from 0 to 1 in a \"confidence\" field."
+VERIFY_PROMPT = "You are a careful fact-checker reviewing a claim from a video transcript that a quicker first pass has already rated. Decide the verdict yourself; do not defer to the first pass. Return a JSON object: {\"verdict\": \"accurate/inaccurate/misleading/unverifiable\", \"explanation\": \"brief explanation\", \"confidence\": 0.0}"
+
+def tiered_enabled():
+    return os.environ.get('FACT_CHECK_TIERED') == '1'
+
+def tier_settings():
+    """Read tiered routing configuration from the environment."""
+    return {
+        'strong_model': os.environ.get('FACT_CHECK_STRONG_MODEL', DEFAULT_STRONG_MODEL),
+        'min_confidence': float(os.environ.get('FACT_CHECK_ESCALATE_CONFIDENCE', DEFAULT_ESCALATE_CONFIDENCE)),
+        'verdicts': frozenset(verdict.strip().lower() for verdict in
+                              os.environ.get('FACT_CHECK_ESCALATE_VERDICTS', DEFAULT_ESCALATE_VERDICTS).split(',') if verdict.strip()),
+        'max_workers': int(os.environ.get('FACT_CHECK_ESCALATE_CONCURRENCY', DEFAULT_ESCALATE_CONCURRENCY)),
+    }
+
+def fast_system_prompt(system_prompt):
+    """The fast pass also asks for a confidence per verdict when tiering is on."""
+    return system_prompt + CONFIDENCE_PROMPT if tiered_enabled() else system_prompt
+
+def routing_fingerprint():
+    """Everything about routing that changes results, for the check record's prompt version."""
+    if not tiered_enabled():
+        return None
+    settings = tier_settings()
+    return {
+        'strong_model': settings['strong_model'],
+        'min_confidence': settings['min_confidence'],
+        'verdicts': sorted(settings['verdicts']),
+        'verify_prompt': VERIFY_PROMPT,
+    }
+
+def needs_escalation(claim, settings):
+    """Doubtful or damaging verdicts go to the strong model. A missing confidence counts as doubtful."""
+    verdict = str(claim.get('verdict', '')).lower()
+    if verdict == 'info':
+        # Placeholder for a response that could not be parsed, nothing to verify
+        return False
+    if verdict in settings['verdicts']:
+        return True
+    try:
+        return float(claim.get('confidence')) < settings['min_confidence']
+    except (TypeError, ValueError):
+        return True
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def escalation_pool(max_workers):
+    """Process-wide pool for strong-model requests.
+
+    Chunks are fact-checked concurrently, each with its own router, so a
+    pool per router would multiply the concurrency limit.
+    """
+    max_workers = max(1, max_workers)
+    with _pools_lock:
+        if max_workers not in _pools:
+            _pools[max_workers] = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='escalation')
+        return _pools[max_workers]
+
+def build_verify_messages(claim):
+    first_pass = f"{claim.get('verdict', 'unverified')}: {claim.get('explanation', '')}"
+    return [
+        {"role": "system", "content": VERIFY_PROMPT},
+        {"role": "user", "content": f"Claim: {claim.get('claim', '')}\n\nTranscript context: {claim.get('context', '')}\n\nFirst pass: {first_pass}"}
+    ]
+
+class ClaimRouter:
+    """Takes fast-pass claims one at a time and verifies the doubtful ones on the strong model.
+
+    Claims that need no verification are passed to on_claim at once; verified
+    ones when the strong model has answered. finish() returns all claims in
+    the order they were added, each with a 'tier' of 'fast' or 'strong'.
+    """
+
+    def __init__(self, client, temperature, on_claim=None, settings=None):
+        self.client = client
+        self.temperature = temperature
+        self.on_claim = on_claim
+        self.settings = settings or tier_settings()
+        self.slots = []
+
+    def add(self, claim):
+        if not isinstance(claim, dict):
+            self.slots.append(claim)
+            return
+
+        if not needs_escalation(claim, self.settings):
+            count('claims_fast')
+            self._emit(dict(claim, tier='fast'))
+            return
+
+        count('claims_escalated')
+        future = escalation_pool(self.settings['max_workers']).submit(self._verify, claim)
+        self.slots.append(future)
+        if self.on_claim is not None:
+            future.add_done_callback(lambda done: self.on_claim(done.result()))
+
+    def _emit(self, claim):
+        self.slots.append(claim)
+        if self.on_claim is not None:
+            self.on_claim(claim)
+
+    def _verify(self, claim):
+        try:
+            with stage('verify_claim'):
+                result = cached_completion(self.client, model=self.settings['strong_model'],
+                                           messages=build_verify_messages(claim), temperature=self.temperature)
+            verdict = json.loads(result)
+            if not isinstance(verdict, dict) or not verdict.get('verdict'):
+                raise ValueError(f"no verdict in {result[:200]!r}")
+        except Exception as e:
+            # Keep the fast verdict rather than fail the video over one claim
+            print(f"Could not verify claim on {self.settings['strong_model']}, keeping the fast verdict: {e}")
+            count('escalation_failures')
+            return dict(claim, tier='fast')
+
+        verified = dict(claim, tier='strong', verdict=verdict['verdict'])
+        if verdict.get('explanation'):
+            verified['explanation'] = verdict['explanation']
+        if verdict.get('confidence') is not None:
+            verified['confidence'] = verdict['confidence']
+        return verified
+
+    def finish(self):
+        """Wait for pending verifications and return the routed claims."""
+        return [slot.result() if isinstance(slot, Future) else slot for slot in self.slots]
+
+def route_claims(claims, client, temperature):
+    """Route an already complete list of fast-pass claims."""
+    router = ClaimRouter(client, temperature)
+    for claim in claims if isinstance(claims, list) else [claims]:
+        router.add(claim)
+    return router.finish()
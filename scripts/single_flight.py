@@ -0,0 +1,174 @@
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+
+DEFAULT_LEASE_DIR = '.cache/leases'
+# A lease not renewed for this long is treated as abandoned by a crashed holder
+DEFAULT_LEASE_SECONDS = 2 * 60
+POLL_SECONDS = 1.0
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key within one process.
+
+    The first caller runs the function; callers arriving while it runs wait
+    and receive the same result, or the same exception.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn, *args, **kwargs):
+        """Return (result, shared), where shared is True for callers that waited on another."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {'done': threading.Event(), 'result': None, 'error': None}
+
+        if not leader:
+            call['done'].wait()
+            if call['error'] is not None:
+                raise call['error']
+            return call['result'], True
+
+        try:
+            call['result'] = fn(*args, **kwargs)
+            return call['result'], False
+        except Exception as e:
+            call['error'] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call['done'].set()
+
+class FileLease:
+    """Cross-process lease on a key, held as an exclusively created lock file.
+
+    The holder keeps it with renew() or keep_alive(); one that stops renewing
+    for ttl seconds is presumed dead and its lease may be broken.
+    """
+
+    def __init__(self, key, directory=DEFAULT_LEASE_DIR, ttl=DEFAULT_LEASE_SECONDS):
+        self.path = os.path.join(directory, f"{key}.lock")
+        self.ttl = ttl
+        self.token = None
+        os.makedirs(directory, exist_ok=True)
+
+    def _record(self):
+        return {'host': socket.gethostname(), 'pid': os.getpid(), 'token': self.token,
+                'expires_at': time.time() + self.ttl}
+
+    def acquire(self):
+        """Take the lease if it is free or abandoned. Returns False while someone else holds it."""
+        try:
+            fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            if not self._expired():
+                return False
+            # Rename is atomic, so only one waiter gets to break an abandoned lease
+            stale_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.stale"
+            try:
+                os.rename(self.path, stale_path)
+                os.remove(stale_path)
+            except FileNotFoundError:
+                pass
+            return self.acquire()
+
+        self.token = uuid.uuid4().hex
+        with os.fdopen(fd, 'w') as f:
+            json.dump(self._record(), f)
+        return True
+
+    def _held(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f).get('token') == self.token
+        except (OSError, ValueError):
+            return False
+
+    def renew(self):
+        """Push the expiry another ttl ahead. Returns False if the lease is no longer ours."""
+        if self.token is None or not self._held():
+            return False
+        tmp_path = f"{self.path}.{self.token}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self._record(), f)
+        os.replace(tmp_path, self.path)
+        return True
+
+    def keep_alive(self, stop):
+        """Renew every third of the ttl until the stop event is set."""
+        while not stop.wait(self.ttl / 3):
+            if not self.renew():
+                print(f"Lost the lease {self.path} to another worker")
+                return
+
+    def _expired(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)['expires_at'] < time.time()
+        except FileNotFoundError:
+            return True
+        except (OSError, ValueError, KeyError):
+            # Half-written by a holder that is still starting up, unless it has been that way a while
+            try:
+                return os.path.getmtime(self.path) + self.ttl < time.time()
+            except FileNotFoundError:
+                return True
+
+    def release(self):
+        # A lease broken and retaken by someone else is theirs to release
+        if self.token is not None and self._held():
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+        self.token = None
+
+    def wait(self, timeout):
+        """Wait until the lease file is gone or abandoned. Returns False on timeout."""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if not os.path.exists(self.path) or self._expired():
+                return True
+            time.sleep(POLL_SECONDS)
+        return False
+
+_flights = SingleFlight()
+
+def run_once(key, fn, *args, **kwargs):
+    """Run fn for a key once across threads and processes on this machine.
+
+    Threads asking for the same key share the leader's result. Other
+    processes wait for the lease holder to finish and then call fn themselves,
+    which is expected to find and reuse the finished result.
+    """
+    if os.environ.get('FACT_CHECK_SINGLE_FLIGHT', '1') == '0':
+        return fn(*args, **kwargs)
+
+    def with_lease():
+        lease = FileLease(key, os.environ.get('FACT_CHECK_LEASE_DIR', DEFAULT_LEASE_DIR),
+                          float(os.environ.get('FACT_CHECK_LEASE_SECONDS', DEFAULT_LEASE_SECONDS)))
+        while not lease.acquire():
+            print(f"{key} is being processed by another worker, waiting for it")
+            lease.wait(lease.ttl)
+        # Long videos can run for longer than the ttl, so the lease is renewed while fn runs
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=lease.keep_alive, args=(stop,), daemon=True)
+        heartbeat.start()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            stop.set()
+            heartbeat.join()
+            lease.release()
+
+    result, shared = _flights.do(key, with_lease)
+    if shared:
+        print(f"{key} was processed by a concurrent request, reusing its result")
+    return result
@@ -0,0 +1,151 @@
+import json
+import os
+import threading
+
+from chunking import ClaimDeduplicator
+from llm_cache import get_cache, record_usage
+from rate_limit import openai_call, estimate_tokens
+
+class JSONArrayParser:
+    """Incrementally yields the objects of a top-level JSON array as their text arrives."""
+
+    def __init__(self):
+        self.buffer = ''
+        self.position = 0
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.element_start = None
+        self.done = False
+
+    def feed(self, text):
+        """Consume more text and return the array elements it completed."""
+        items = []
+        if self.done:
+            return items
+
+        self.buffer += text
+        buffer = self.buffer
+        position = self.position
+
+        while position < len(buffer):
+            char = buffer[position]
+
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == '\\':
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif self.depth == 0:
+                # Skip anything before the array, such as a ```json fence
+                if char == '[':
+                    self.depth = 1
+            elif char == '"':
+                self.in_string = True
+            elif char in '{[':
+                if self.depth == 1 and char == '{':
+                    self.element_start = position
+                self.depth += 1
+            elif char in '}]':
+                self.depth -= 1
+                if self.depth == 1 and char == '}' and self.element_start is not None:
+                    try:
+                        items.append(json.loads(buffer[self.element_start:position + 1]))
+                    except ValueError:
+                        pass
+                    self.element_start = None
+                elif self.depth == 0:
+                    self.done = True
+                    break
+            position += 1
+
+        # Drop text that no pending element can refer to any more
+        keep_from = self.element_start if self.element_start is not None else position
+        self.buffer = buffer[keep_from:]
+        self.position = position - keep_from
+        if self.element_start is not None:
+            self.element_start = 0
+        return items
+
+def stream_completion(client, model, messages, temperature, on_item):
+    """Stream a chat completion, calling on_item for each array element as it completes.
+
+    Returns the full response text. Cached responses replay their elements at once.
+    """
+    parser = JSONArrayParser()
+    cache = get_cache()
+    key = None
+    if cache is not None:
+        key = cache.make_key(model, messages, temperature)
+        cached = cache.get(key)
+        if cached is not None:
+            for item in parser.feed(cached):
+                on_item(item)
+            return cached
+
+    stream = openai_call(client.chat.completions.create, model=model, messages=messages, temperature=temperature,
+                         stream=True, stream_options={'include_usage': True}, tokens=estimate_tokens(messages))
+    parts = []
+    for chunk in stream:
+        # With include_usage the final chunk carries token counts and no choices
+        if getattr(chunk, 'usage', None) is not None:
+            record_usage(chunk.usage)
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if not delta:
+            continue
+        parts.append(delta)
+        for item in parser.feed(delta):
+            on_item(item)
+
+    result = ''.join(parts)
+    if cache is not None:
+        cache.put(key, result)
+    return result
+
+def write_json_atomic(path, data, **kwargs):
+    """Write JSON through a temporary file so readers never see a half-written file."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, **kwargs)
+    os.replace(tmp_path, path)
+
+def is_partial_result(path):
+    """True if a results file was left behind by an unfinished streaming run."""
+    try:
+        with open(path) as f:
+            return json.load(f).get('status') == 'partial'
+    except (OSError, ValueError):
+        return False
+
+class PartialResultWriter:
+    """Aligns streamed claims and rewrites the results file, marked partial, as each one lands."""
+
+    def __init__(self, video_id, output_path, transcript_data, match_fn, aligner, initial_claims=()):
+        self.video_id = video_id
+        self.output_path = output_path
+        self.transcript_data = transcript_data
+        self.match_fn = match_fn
+        self.aligner = aligner
+        self.deduplicator = ClaimDeduplicator()
+        self.results = []
+        self._lock = threading.Lock()
+
+        for claim in initial_claims:
+            self.add(claim)
+
+    def add(self, claim):
+        with self._lock:
+            if not self.deduplicator.add(claim):
+                return
+            self.results.extend(self.match_fn([claim], self.transcript_data, aligner=self.aligner))
+            write_json_atomic(self.output_path, {
+                'video_id': self.video_id,
+                'status': 'partial',
+                'claims': self.results
+            }, indent=2)
+            if len(self.results) == 1:
+                print(f"First claim written to {self.output_path}")
@@ -0,0 +1,44 @@
+import math
+
+DEFAULT_BUCKET_SECONDS = 10
+# An overlay appears this long before its claim starts and stays until the claim's
+# span ends, but at least OVERLAY_MIN_SECONDS in all. Mirrored in js/video-player.js
+OVERLAY_LEAD_SECONDS = 3
+OVERLAY_MIN_SECONDS = 6
+
+def sort_claims(claims):
+    """Claims ordered by start, then end. Also returns the new position of each original index."""
+    order = sorted(range(len(claims)), key=lambda index: (claims[index].get('timestamp', 0), claims[index].get('end') or 0))
+    positions = [0] * len(claims)
+    for position, index in enumerate(order):
+        positions[index] = position
+    return [claims[index] for index in order], positions
+
+def overlay_interval(claim):
+    """Seconds [start, end) during which a claim's overlay is shown."""
+    start = claim.get('timestamp', 0)
+    end = max(claim.get('end') or 0, start - OVERLAY_LEAD_SECONDS + OVERLAY_MIN_SECONDS)
+    return max(0, start - OVERLAY_LEAD_SECONDS), end
+
+def build_timeline(claims, bucket_seconds=DEFAULT_BUCKET_SECONDS):
+    """Index from time bucket to the claims whose overlay is shown at some point in it.
+
+    Bucket k covers [k * bucket_seconds, (k + 1) * bucket_seconds); only
+    non-empty buckets are listed, keyed by k as a string. The player looks up
+    the bucket for the current time and checks just those claims, so its cost
+    per tick does not grow with the number of claims in the video.
+    """
+    buckets = {}
+    for index, claim in enumerate(claims):
+        start, end = overlay_interval(claim)
+        first = int(start // bucket_seconds)
+        last = max(first, math.ceil(end / bucket_seconds) - 1)
+        for bucket in range(first, last + 1):
+            buckets.setdefault(str(bucket), []).append(index)
+
+    return {
+        'bucket_seconds': bucket_seconds,
+        'lead_seconds': OVERLAY_LEAD_SECONDS,
+        'min_seconds': OVERLAY_MIN_SECONDS,
+        'buckets': buckets,
+    }
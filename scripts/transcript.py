@@ -0,0 +1,134 @@
+from array import array
+from bisect import bisect_right
+
+from metrics import stage
+
+class Transcript:
+    """Caption segments stored as one text buffer plus start-time and offset arrays.
+
+    Segment i covers text[offsets[i]:offsets[i + 1] - 1]; segments are joined by
+    single spaces, so the buffer is also the full transcript text. A lowercased
+    copy is built once. Slicing returns a window that shares all buffers, and
+    indexes and offsets on a window are relative to the window.
+    """
+
+    __slots__ = ('_starts', '_offsets', '_text', '_lower', '_lo', '_hi')
+
+    def __init__(self, starts, offsets, text, lower=None, lo=0, hi=None):
+        self._starts = starts
+        self._offsets = offsets
+        self._text = text
+        self._lower = _lowercase(text) if lower is None else lower
+        self._lo = lo
+        self._hi = len(starts) if hi is None else hi
+
+    @classmethod
+    def from_entries(cls, entries):
+        """Build a transcript from [{'start': ..., 'text': ...}] entries."""
+        starts = array('d')
+        offsets = array('q', [0])
+        texts = []
+        position = 0
+        for entry in entries:
+            starts.append(float(entry['start']))
+            texts.append(entry['text'])
+            position += len(entry['text']) + 1
+            offsets.append(position)
+        return cls(starts, offsets, ' '.join(texts))
+
+    def __len__(self):
+        return self._hi - self._lo
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            first, last, step = key.indices(len(self))
+            if step != 1:
+                raise ValueError("Transcript windows do not support steps")
+            last = max(first, last)
+            return Transcript(self._starts, self._offsets, self._text, self._lower, self._lo + first, self._lo + last)
+        return {'start': self.start(key), 'text': self.segment_text(key)}
+
+    def _index(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("segment index out of range")
+        return self._lo + index
+
+    def start(self, index):
+        return self._starts[self._index(index)]
+
+    def segment_text(self, index):
+        index = self._index(index)
+        return self._text[self._offsets[index]:self._offsets[index + 1] - 1]
+
+    def segment_lower(self, index):
+        index = self._index(index)
+        return self._lower[self._offsets[index]:self._offsets[index + 1] - 1]
+
+    def segment_offset(self, index):
+        """Character offset of a segment in this window's text; len(self) gives the end."""
+        return self._offsets[self._lo + index] - self._offsets[self._lo]
+
+    @property
+    def char_count(self):
+        """Length of text without building it."""
+        return max(0, self._offsets[self._hi] - self._offsets[self._lo] - 1)
+
+    @property
+    def text(self):
+        # The full-range slice of a str is the str itself, so the whole transcript costs no copy
+        return self._text[self._offsets[self._lo]:self._offsets[self._lo] + self.char_count]
+
+    @property
+    def lower(self):
+        return self._lower[self._offsets[self._lo]:self._offsets[self._lo] + self.char_count]
+
+    def index_at_time(self, seconds):
+        """Index of the segment playing at a time (start times must be ascending)."""
+        index = bisect_right(self._starts, seconds, self._lo, self._hi) - 1
+        return max(index, self._lo) - self._lo
+
+    def index_at_offset(self, offset):
+        """Index of the segment containing a character offset of this window's text."""
+        index = bisect_right(self._offsets, self._offsets[self._lo] + offset, self._lo, self._hi) - 1
+        return max(index, self._lo) - self._lo
+
+    def time_at_offset(self, offset):
+        return self.start(self.index_at_offset(offset))
+
+    def offset_at_time(self, seconds):
+        return self.segment_offset(self.index_at_time(seconds))
+
+    def select(self, indexes):
+        """New transcript holding only the given segments, in order. Copies their text."""
+        return Transcript.from_entries(self[index] for index in indexes)
+
+    def to_entries(self):
+        return list(self)
+
+def _lowercase(text):
+    lower = text.lower()
+    if len(lower) == len(text):
+        return lower
+    # A few characters lowercase to two code points; keep those as-is so offsets line up
+    return ''.join(char.lower() if len(char.lower()) == 1 else char for char in text)
+
+def as_transcript(transcript_data):
+    """Accept either a Transcript or a list of {'start', 'text'} entries."""
+    if isinstance(transcript_data, Transcript):
+        return transcript_data
+    return Transcript.from_entries(transcript_data)
+
+def format_transcript(transcript):
+    """Convert transcript entries to the full text and a Transcript."""
+    if not transcript:
+        return None, None
+
+    with stage('format_transcript'):
+        transcript_data = Transcript.from_entries(transcript)
+    return transcript_data.text, transcript_data
@@ -0,0 +1,277 @@
+"""Fetches YouTube caption tracks for the pipeline, shared across videos.
+
+One fetcher keeps a yt-dlp extractor per worker thread and a pooled HTTP
+session, so a queue run pays for setup and TLS handshakes once rather than
+per video. Raw json3 payloads are cached under FACT_CHECK_SUBTITLE_CACHE_DIR
+(default .cache/subtitles) for FACT_CHECK_SUBTITLE_TTL seconds (default one
+day, 0 disables the cache); a cached video skips the metadata lookup too.
+prefetch() looks up the caption URLs of queued videos on up to
+FACT_CHECK_FETCH_WORKERS threads (default 4) while earlier ones are checked.
+"""
+import codecs
+import glob
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import yt_dlp
+from requests.adapters import HTTPAdapter
+
+from metrics import stage, count
+
+DEFAULT_SUBTITLE_CACHE_DIR = '.cache/subtitles'
+DEFAULT_SUBTITLE_TTL = 24 * 60 * 60
+DEFAULT_FETCH_WORKERS = 4
+DEFAULT_LANGUAGE = 'en'
+# Seconds to connect and between bytes received, not for the whole download
+DOWNLOAD_TIMEOUT = 30
+READ_SIZE = 64 * 1024
+
+class Json3Parser:
+    """Yields transcript segments from a json3 caption payload as its bytes arrive.
+
+    The events array follows a few small styling tables, so everything before
+    its key is skipped. Each event is decoded with json's C scanner once its
+    text is complete; an event cut off by the end of a read waits for the next.
+    """
+
+    KEY = '"events"'
+    SEPARATORS = re.compile(r'[\s,]*')
+
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._json = json.JSONDecoder()
+        self._buffer = ''
+        self._in_events = False
+        self.done = False
+
+    def feed(self, data):
+        self._buffer += self._decoder.decode(data)
+        if not self._in_events:
+            index = self._buffer.find(self.KEY)
+            if index < 0:
+                # Keep enough to find a key split across reads
+                self._buffer = self._buffer[-len(self.KEY):]
+                return []
+            opening = self._buffer.find('[', index + len(self.KEY))
+            if opening < 0:
+                self._buffer = self._buffer[index:]
+                return []
+            self._buffer = self._buffer[opening + 1:]
+            self._in_events = True
+
+        segments = []
+        buffer = self._buffer
+        position = 0
+        while not self.done:
+            position = self.SEPARATORS.match(buffer, position).end()
+            if position == len(buffer):
+                break
+            if buffer[position] == ']':
+                self.done = True
+                break
+            try:
+                event, position_after = self._json.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # The rest of this event has not arrived yet
+                break
+            position = position_after
+            if 'segs' not in event:
+                continue
+            caption = ''.join(seg.get('utf8', '') for seg in event['segs']).strip()
+            if caption:
+                segments.append({'start': event.get('tStartMs', 0) / 1000.0, 'text': caption})
+        self._buffer = buffer[position:]
+        return segments
+
+def parse_json3(chunks):
+    """Transcript segments from an iterable of json3 byte chunks."""
+    parser = Json3Parser()
+    segments = []
+    for data in chunks:
+        segments.extend(parser.feed(data))
+    if not parser.done:
+        raise ValueError("json3 payload ended before its events array did")
+    return segments
+
+class TranscriptFetcher:
+    """Reusable transcript source; safe to share between threads."""
+
+    def __init__(self, language=DEFAULT_LANGUAGE, cache_dir=DEFAULT_SUBTITLE_CACHE_DIR,
+                 cache_ttl=DEFAULT_SUBTITLE_TTL, max_workers=DEFAULT_FETCH_WORKERS):
+        self.language = language
+        self.cache_dir = cache_dir
+        self.cache_ttl = cache_ttl
+        self.max_workers = max(1, max_workers)
+        self.ydl_opts = {
+            'skip_download': True,
+            'writesubtitles': True,
+            'writeautomaticsub': True,
+            'subtitleslangs': [language],
+            'subtitlesformat': 'json3',
+            'quiet': True,
+            'no_warnings': True,
+        }
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.max_workers, pool_maxsize=self.max_workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self._local = threading.local()
+        self._extractors = []
+        self._pending = {}
+        self._executor = None
+        self._lock = threading.Lock()
+
+        if self.cache_ttl > 0:
+            os.makedirs(cache_dir, exist_ok=True)
+            self._prune_cache()
+
+    def _prune_cache(self):
+        cutoff = time.time() - self.cache_ttl
+        for path in glob.glob(os.path.join(self.cache_dir, '*.json3')):
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _cache_path(self, video_id):
+        return os.path.join(self.cache_dir, f"{video_id}.{self.language}.json3")
+
+    def _cached(self, video_id):
+        """Path of a fresh cached payload for the video, or None."""
+        if self.cache_ttl <= 0:
+            return None
+        path = self._cache_path(video_id)
+        try:
+            if os.path.getmtime(path) + self.cache_ttl >= time.time():
+                return path
+        except FileNotFoundError:
+            pass
+        return None
+
+    def _extractor(self):
+        # YoutubeDL keeps per-extraction state, so each thread gets its own and keeps it
+        ydl = getattr(self._local, 'ydl', None)
+        if ydl is None:
+            ydl = self._local.ydl = yt_dlp.YoutubeDL(self.ydl_opts)
+            with self._lock:
+                self._extractors.append(ydl)
+        return ydl
+
+    def subtitle_url(self, video_id):
+        """The json3 caption URL for a video, preferring manual captions. None if it has none."""
+        with stage('yt_dlp_extract'):
+            info = self._extractor().extract_info(f'https://www.youtube.com/watch?v={video_id}', download=False)
+
+        # Prefer manual subtitles, fall back to auto-generated
+        tracks = info.get('subtitles', {}).get(self.language) or info.get('automatic_captions', {}).get(self.language)
+        if not tracks:
+            print(f"No {self.language} subtitles found for {video_id}")
+            return None
+        for track in tracks:
+            if track.get('ext') == 'json3':
+                return track.get('url')
+        print(f"No json3 subtitle format found for {video_id}")
+        return None
+
+    def prefetch(self, video_ids):
+        """Start looking up caption URLs for videos that will be fetched soon."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            for video_id in video_ids:
+                if video_id and video_id not in self._pending and self._cached(video_id) is None:
+                    self._pending[video_id] = self._executor.submit(self.subtitle_url, video_id)
+
+    def _download(self, video_id, url):
+        parser = Json3Parser()
+        segments = []
+        cache_path = self._cache_path(video_id) if self.cache_ttl > 0 else None
+        tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp" if cache_path else None
+
+        with stage('subtitle_download'), self.session.get(url, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+            response.raise_for_status()
+            cache_file = open(tmp_path, 'wb') if tmp_path else None
+            try:
+                for data in response.iter_content(READ_SIZE):
+                    count('subtitle_bytes', len(data))
+                    if cache_file is not None:
+                        cache_file.write(data)
+                    segments.extend(parser.feed(data))
+                if not parser.done:
+                    raise ValueError("json3 payload ended before its events array did")
+            except BaseException:
+                if cache_file is not None:
+                    cache_file.close()
+                    os.remove(tmp_path)
+                raise
+
+        if cache_file is not None:
+            cache_file.close()
+            os.replace(tmp_path, cache_path)
+        return segments
+
+    def get_transcript(self, video_id):
+        """Transcript segments [{'start', 'text'}] for a video, or None if it has none or fetching fails."""
+        try:
+            cache_path = self._cached(video_id)
+            if cache_path is not None:
+                count('subtitle_cache_hits')
+                with open(cache_path, 'rb') as f:
+                    transcript = parse_json3(iter(lambda: f.read(READ_SIZE), b''))
+            else:
+                with self._lock:
+                    pending = self._pending.pop(video_id, None)
+                url = pending.result() if pending is not None else self.subtitle_url(video_id)
+                if not url:
+                    return None
+                transcript = self._download(video_id, url)
+
+            print(f"Successfully fetched transcript with {len(transcript)} entries")
+            return transcript
+
+        except Exception as e:
+            print(f"Error fetching transcript: {e}")
+            print(f"Error type: {type(e).__name__}")
+            return None
+
+    def close(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(cancel_futures=True)
+                self._executor = None
+            for ydl in self._extractors:
+                ydl.close()
+            self._extractors = []
+            self._pending = {}
+        self.session.close()
+
+_shared = None
+_shared_lock = threading.Lock()
+
+def shared_fetcher():
+    """The process-wide fetcher, configured from the environment on first use."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = TranscriptFetcher(
+                cache_dir=os.environ.get('FACT_CHECK_SUBTITLE_CACHE_DIR', DEFAULT_SUBTITLE_CACHE_DIR),
+                cache_ttl=float(os.environ.get('FACT_CHECK_SUBTITLE_TTL', DEFAULT_SUBTITLE_TTL)),
+                max_workers=int(os.environ.get('FACT_CHECK_FETCH_WORKERS', DEFAULT_FETCH_WORKERS)),
+            )
+        return _shared
+
+def close_shared_fetcher():
+    """Close the process-wide fetcher, if one was created, and let the next use start afresh."""
+    global _shared
+    with _shared_lock:
+        fetcher, _shared = _shared, None
+    if fetcher is not None:
+        fetcher.close()
@@ -0,0 +1,268 @@
+"""Long-running fact-check worker that keeps its clients warm between jobs.
+
+Jobs are JSON files in a spool directory:
+  {"issue_number": 12}                      process a "Fact-check:" issue and close it
+  {"video_id": "...", "transcript": [...]}  fact-check a transcript
+  {"video_id": "..."}                       fetch the transcript with yt-dlp first
+
+A job is claimed by renaming it from incoming/ to processing/, which is
+atomic, so several daemons can share one spool directory. Finished jobs
+move to done/ or failed/ with their outcome attached. A daemon touches
+the files of its running jobs every few seconds, and any daemon sharing
+the spool requeues jobs in processing/ that have gone untouched for
+STALE_SECONDS, because the daemon running them died. With --poll-issues the
+daemon also enqueues new issues itself, using the same conditional
+requests as process_queue.py.
+
+Usage:
+  python scripts/worker_daemon.py run [--workers 4] [--poll-issues 30]
+  python scripts/worker_daemon.py enqueue --issue 12
+  python scripts/worker_daemon.py enqueue VIDEO_ID [--transcript transcript.json]
+"""
+import argparse
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from metrics import count, write_metrics, write_prometheus
+
+DEFAULT_QUEUE_DIR = 'queue'
+DEFAULT_WORKERS = 4
+DEFAULT_POLL_SECONDS = 1.0
+SPOOL_DIRS = ('incoming', 'processing', 'done', 'failed')
+# Running jobs are touched this often; one untouched for STALE_SECONDS has lost its daemon
+HEARTBEAT_SECONDS = 15
+STALE_SECONDS = 120
+
+def spool_path(queue_dir, state, name=''):
+    return os.path.join(queue_dir, state, name)
+
+def enqueue(queue_dir, job):
+    """Add a job to the spool. Returns its file name."""
+    for state in SPOOL_DIRS:
+        os.makedirs(spool_path(queue_dir, state), exist_ok=True)
+    label = job.get('video_id') or f"issue-{job.get('issue_number')}"
+    name = f"{time.time_ns()}-{label}.json"
+    tmp_path = spool_path(queue_dir, 'incoming', f".{name}.tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(job, f)
+    # Rename so workers never pick up a half-written job
+    os.replace(tmp_path, spool_path(queue_dir, 'incoming', name))
+    return name
+
+def claim(queue_dir, name):
+    """Move a job to processing/. Returns False if another worker got there first."""
+    try:
+        os.rename(spool_path(queue_dir, 'incoming', name), spool_path(queue_dir, 'processing', name))
+    except FileNotFoundError:
+        return False
+    # The rename keeps the enqueue time, which may already look stale
+    heartbeat(queue_dir, [name])
+    return True
+
+def heartbeat(queue_dir, names):
+    """Mark running jobs as alive for requeue_stale in this and other daemons."""
+    for name in names:
+        try:
+            os.utime(spool_path(queue_dir, 'processing', name))
+        except FileNotFoundError:
+            pass
+
+def requeue_stale(queue_dir, stale_seconds=STALE_SECONDS):
+    """Move jobs whose daemon stopped touching them back to incoming/."""
+    cutoff = time.time() - stale_seconds
+    for name in os.listdir(spool_path(queue_dir, 'processing')):
+        path = spool_path(queue_dir, 'processing', name)
+        try:
+            if os.path.getmtime(path) >= cutoff:
+                continue
+            os.rename(path, spool_path(queue_dir, 'incoming', name))
+        except FileNotFoundError:
+            # Finished, or requeued by another daemon, in the meantime
+            continue
+        print(f"Requeued interrupted job {name}")
+
+def reap(in_flight):
+    """Drop finished jobs from in_flight, logging any error raised after the job itself ran."""
+    for future, name in list(in_flight.items()):
+        if not future.done():
+            continue
+        del in_flight[future]
+        error = future.exception()
+        if error is not None:
+            print(f"Job {name}: error while recording its outcome: {type(error).__name__}: {error}")
+            count('jobs_errors')
+
+class WarmClients:
+    """API clients, connection pools and caches created once for the daemon's lifetime."""
+
+    def __init__(self, workers):
+        from rate_limit import create_openai_client, create_github_client, github_call
+        self.openai = create_openai_client(os.environ['OPENAI_API_KEY'])
+        self.github = None
+        self.repo = None
+
+        github_token = os.environ.get('GITHUB_TOKEN')
+        repo_name = os.environ.get('GITHUB_REPOSITORY')
+        if github_token and repo_name:
+            self.github = create_github_client(github_token, pool_size=workers)
+            self.repo = github_call(self.github.get_repo, repo_name)
+
+        # Load the response cache and claim index now rather than on the first job
+        from llm_cache import get_cache
+        from claim_index import get_claim_index
+        get_cache()
+        get_claim_index()
+
+def run_job(job, clients):
+    """Run one job. Returns (succeeded, message)."""
+    import process_single_issue
+    from rate_limit import github_call
+
+    if job.get('issue_number'):
+        if clients.repo is None:
+            return False, "Issue jobs need GITHUB_TOKEN and GITHUB_REPOSITORY"
+        issue = github_call(clients.repo.get_issue, int(job['issue_number']))
+        succeeded = process_single_issue.process_issue(issue, clients.repo, clients.openai, clients.github)
+        return succeeded, 'Issue processed' if succeeded else 'Issue closed as failed'
+
+    if job.get('transcript'):
+        result = process_single_issue.process_video(job['video_id'], job['transcript'], clients.openai)
+    else:
+        import process_queue
+        result = process_queue.process_video(job['video_id'], clients.openai)
+    return True, result['message']
+
+def work(queue_dir, name, clients):
+    started = time.time()
+    path = spool_path(queue_dir, 'processing', name)
+    raw, job = '', None
+    try:
+        with open(path) as f:
+            raw = f.read()
+        job = json.loads(raw)
+        succeeded, message = run_job(job, clients)
+    except Exception as e:
+        succeeded, message = False, str(e)
+
+    if not isinstance(job, dict):
+        # A malformed job still leaves processing/, keeping its text next to the outcome
+        job = {'raw': raw}
+    elapsed = time.time() - started
+    job['outcome'] = {'succeeded': succeeded, 'message': message, 'seconds': round(elapsed, 2), 'finished_at': time.time()}
+    with open(path, 'w') as f:
+        json.dump(job, f)
+    os.rename(path, spool_path(queue_dir, 'done' if succeeded else 'failed', name))
+    print(f"Job {name}: {'done' if succeeded else 'failed'} in {elapsed:.1f}s - {message}")
+    count('jobs_done' if succeeded else 'jobs_failed')
+    # Scraped while the daemon runs; the JSON file is written once at shutdown
+    write_prometheus('worker_daemon')
+
+def run(queue_dir, workers, poll_seconds, poll_issues_seconds=None):
+    for state in SPOOL_DIRS:
+        os.makedirs(spool_path(queue_dir, state), exist_ok=True)
+    requeue_stale(queue_dir)
+
+    started = time.time()
+    clients = WarmClients(workers)
+    print(f"Worker daemon ready in {time.time() - started:.1f}s with {workers} workers, watching {queue_dir}/incoming")
+
+    stop = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stop.set())
+
+    discovery = None
+    next_issue_poll = 0.0
+    if poll_issues_seconds and clients.repo is not None:
+        from issue_discovery import IssueDiscovery
+        discovery = IssueDiscovery(clients.github, clients.repo, os.environ['GITHUB_TOKEN'])
+
+    in_flight = {}
+    queued_issues = set()
+    next_heartbeat = 0.0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while not stop.is_set():
+            reap(in_flight)
+
+            if time.time() >= next_heartbeat:
+                next_heartbeat = time.time() + HEARTBEAT_SECONDS
+                heartbeat(queue_dir, in_flight.values())
+                requeue_stale(queue_dir)
+
+            if discovery is not None and time.time() >= next_issue_poll:
+                next_issue_poll = time.time() + poll_issues_seconds
+                try:
+                    for issue in discovery.discover():
+                        if issue.number not in queued_issues:
+                            enqueue(queue_dir, {'issue_number': issue.number})
+                            queued_issues.add(issue.number)
+                    # Enqueued jobs survive restarts, so the watermark can advance now
+                    discovery.save()
+                except Exception as e:
+                    print(f"Issue poll failed: {e}")
+
+            claimed = False
+            free = workers - len(in_flight)
+            if free > 0:
+                for name in sorted(os.listdir(spool_path(queue_dir, 'incoming'))):
+                    if free == 0:
+                        break
+                    if name.startswith('.') or not claim(queue_dir, name):
+                        continue
+                    in_flight[executor.submit(work, queue_dir, name, clients)] = name
+                    claimed = True
+                    free -= 1
+
+            stop.wait(0.05 if claimed else poll_seconds)
+
+        if in_flight:
+            print(f"Stopping: waiting for {len(in_flight)} running jobs")
+            # Keep them alive for other daemons while they finish
+            while in_flight:
+                heartbeat(queue_dir, in_flight.values())
+                wait(list(in_flight), timeout=HEARTBEAT_SECONDS)
+                reap(in_flight)
+
+    write_metrics('worker_daemon')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--queue-dir', default=os.environ.get('DAEMON_QUEUE_DIR', DEFAULT_QUEUE_DIR))
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='process jobs until interrupted')
+    run_parser.add_argument('--workers', type=int, default=int(os.environ.get('DAEMON_WORKERS', DEFAULT_WORKERS)))
+    run_parser.add_argument('--poll-seconds', type=float, default=DEFAULT_POLL_SECONDS)
+    run_parser.add_argument('--poll-issues', type=float, metavar='SECONDS', help='also enqueue new fact-check issues this often')
+
+    enqueue_parser = commands.add_parser('enqueue', help='add a job to the queue')
+    enqueue_parser.add_argument('video_id', nargs='?')
+    enqueue_parser.add_argument('--issue', type=int, help='issue number to process')
+    enqueue_parser.add_argument('--transcript', help='JSON file with [{"start": ..., "text": ...}]')
+
+    args = parser.parse_args()
+
+    if args.command == 'enqueue':
+        if args.issue:
+            job = {'issue_number': args.issue}
+        elif args.video_id:
+            job = {'video_id': args.video_id}
+            if args.transcript:
+                with open(args.transcript) as f:
+                    job['transcript'] = json.load(f)
+        else:
+            parser.error('enqueue needs a video ID or --issue')
+        print(f"Enqueued {enqueue(args.queue_dir, job)}")
+        return
+
+    if not os.environ.get('OPENAI_API_KEY'):
+        print("Missing required environment variables")
+        sys.exit(1)
+    run(args.queue_dir, args.workers, args.poll_seconds, args.poll_issues)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+import os
+import re
+
+from transcript import as_transcript
+
+DEFAULT_THRESHOLD = 1.5
+# Captions kept on each side of a check-worthy sentence so the model sees its context
+CONTEXT_SEGMENTS = 1
+# Long runs without punctuation are cut at this length
+MAX_SENTENCE_WORDS = 30
+MIN_SENTENCE_WORDS = 4
+# Below this share of segments ending a sentence, captions are treated as unpunctuated
+MIN_PUNCTUATED_SHARE = 0.1
+
+NUMBER_PATTERN = re.compile(
+    r'\d|\b(?:hundred|thousand|million|billion|trillion|percent|dozen|twice|half|double[sd]?|triple[sd]?)\b',
+    re.IGNORECASE)
+YEAR_PATTERN = re.compile(r'\b(?:1[5-9]\d\d|20\d\d)s?\b')
+UNIT_PATTERN = re.compile(r'[%$€£]|\b(?:dollars?|euros?|pounds|miles|kilometers|degrees|years?|tons?|people)\b', re.IGNORECASE)
+COMPARATIVE_PATTERN = re.compile(
+    r'\b(?:than|more|less|fewer|most|least|larger|largest|bigger|biggest|smaller|smallest|higher|highest|lower|lowest|'
+    r'longer|longest|tallest|faster|fastest|older|oldest|richest|deadliest|first|only|'
+    r'increased?|decreased?|rose|fell|grew|doubled|tripled|record)\b',
+    re.IGNORECASE)
+ATTRIBUTION_PATTERN = re.compile(
+    r'\b(?:said|says|according|reported|reports|study|studies|research|researchers|scientists|experts|survey|data|'
+    r'evidence|found|shows?|showed|proves?|proved|confirmed|claims?|announced|statistics)\b',
+    re.IGNORECASE)
+ASSERTION_PATTERN = re.compile(
+    r'\b(?:always|never|every|all|none|leads? to|linked|discovered|founded|born|died|'
+    r'illegal|banned|law)\b',
+    re.IGNORECASE)
+# Causal, medical and conspiracy claims; often the ones most worth checking, and they
+# come without numbers or names, least of all in lowercase unpunctuated auto-captions
+CLAIM_PATTERN = re.compile(
+    r'\b(?:caus(?:es?|ed|ing)|cur(?:es?|ed)|prevents?|prevented|kills?|poison(?:s|ed|ous)?|toxic|invented|'
+    r'hoax|fake[ds]?|faking|staged|rigged|hid(?:es?|den)?|cover(?:s|ed)? ?-?up|secret(?:ly)?|conspiracy|lied|lies|'
+    r'(?:is|are|was|were) (?:actually|really|not) (?:real|true|flat|safe)|never happened|(?:is|are) actually)\b',
+    re.IGNORECASE)
+# Channel chatter that never carries a checkable claim
+CHATTER_PATTERN = re.compile(
+    r'\b(?:subscribe|sponsor(?:ed)?|patreon|merch|promo code|discount code|link in the description|'
+    r'welcome back|hey (?:guys|everyone)|thanks for watching|see you (?:next time|in the next)|smash that)\b',
+    re.IGNORECASE)
+# Capitalised words that are not names
+COMMON_CAPITALS = frozenset(['I', "I'm", "I've", "I'll", "I'd", 'OK', 'Okay', 'So', 'And', 'But', 'The', 'This', 'That'])
+SENTENCE_END = ('.', '?', '!')
+
+def score_sentence(text):
+    """Lexical check-worthiness score of one sentence. Higher means more likely to make a factual claim."""
+    words = text.split()
+    if len(words) < MIN_SENTENCE_WORDS:
+        return 0.0
+
+    score = 0.0
+    if NUMBER_PATTERN.search(text):
+        score += 1.5
+    if YEAR_PATTERN.search(text):
+        score += 1.0
+    if UNIT_PATTERN.search(text):
+        score += 0.5
+    # Named entities: capitalised words that do not start the sentence
+    names = sum(1 for word in words[1:] if word[:1].isupper() and word.strip('.,!?') not in COMMON_CAPITALS)
+    score += min(names, 2) * 0.75
+    score += min(len(COMPARATIVE_PATTERN.findall(text)), 2) * 0.75
+    score += min(len(ATTRIBUTION_PATTERN.findall(text)), 2) * 0.75
+    score += min(len(ASSERTION_PATTERN.findall(text)), 2) * 0.5
+    if CLAIM_PATTERN.search(text):
+        score += 1.5
+    if CHATTER_PATTERN.search(text):
+        score -= 3.0
+    return score
+
+def group_sentences(transcript_data):
+    """Group caption segments into sentences. Returns (first, last) segment index pairs.
+
+    Auto-generated captions have no punctuation; each of their segments is
+    scored on its own and context segments cover claims split across lines.
+    """
+    transcript_data = as_transcript(transcript_data)
+    texts = [transcript_data.segment_text(index).rstrip() for index in range(len(transcript_data))]
+    ends = sum(1 for text in texts if text.endswith(SENTENCE_END))
+    if ends < MIN_PUNCTUATED_SHARE * len(transcript_data):
+        return [(index, index) for index in range(len(transcript_data))]
+
+    sentences = []
+    first = 0
+    words = 0
+    for index, text in enumerate(texts):
+        words += len(text.split())
+        if text.endswith(SENTENCE_END) or words >= MAX_SENTENCE_WORDS:
+            sentences.append((first, index))
+            first = index + 1
+            words = 0
+    if first < len(transcript_data):
+        sentences.append((first, len(transcript_data) - 1))
+    return sentences
+
+def filter_check_worthy(transcript_data, threshold=DEFAULT_THRESHOLD, context=CONTEXT_SEGMENTS):
+    """Keep the segments of check-worthy sentences plus their neighbours. Returns (kept transcript, stats).
+
+    Kept segments keep their original start times.
+    """
+    transcript_data = as_transcript(transcript_data)
+    keep = [False] * len(transcript_data)
+    worthy = 0
+    sentences = group_sentences(transcript_data)
+
+    for first, last in sentences:
+        text = transcript_data[first:last + 1].text
+        if score_sentence(text) < threshold:
+            continue
+        worthy += 1
+        for index in range(max(0, first - context), min(len(transcript_data), last + context + 1)):
+            keep[index] = True
+
+    if all(keep):
+        kept = transcript_data
+    else:
+        kept = transcript_data.select(index for index in range(len(transcript_data)) if keep[index])
+    # Segment text plus its joining space, as in chunking
+    original_chars = transcript_data.char_count + 1 if len(transcript_data) else 0
+    kept_chars = kept.char_count + 1 if len(kept) else 0
+    stats = {
+        'sentences': len(sentences),
+        'worthy_sentences': worthy,
+        'original_segments': len(transcript_data),
+        'kept_segments': len(kept),
+        # Same 4 characters per token estimate as rate_limit.estimate_tokens
+        'original_tokens': original_chars // 4,
+        'kept_tokens': kept_chars // 4,
+        'saved_tokens': (original_chars - kept_chars) // 4,
+    }
+    return kept, stats
+
+def prefilter_for_prompt(transcript_data):
+    """Drop segments unlikely to contain claims when FACT_CHECK_PREFILTER=1, printing the token savings.
+
+    Off by default: a lexical score misses some claims, and a missed claim costs
+    more than the tokens saved.
+    """
+    if os.environ.get('FACT_CHECK_PREFILTER', '0') != '1' or not transcript_data:
+        return transcript_data
+
+    threshold = float(os.environ.get('FACT_CHECK_PREFILTER_THRESHOLD', DEFAULT_THRESHOLD))
+    kept, stats = filter_check_worthy(transcript_data, threshold)
+    saved = stats['saved_tokens'] / stats['original_tokens'] if stats['original_tokens'] else 0.0
+    print(f"Check-worthiness filter: {stats['worthy_sentences']}/{stats['sentences']} sentences kept, "
+          f"{stats['kept_segments']}/{stats['original_segments']} segments, "
+          f"~{stats['saved_tokens']} of {stats['original_tokens']} prompt tokens saved ({saved:.0%})")
+    return kept